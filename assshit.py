@@ -1,11 +1,63 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-# Combined single-file build WITHOUT debug_probe. Sections below are verbatim except debug lines removed.
+# Combined single-file build WITHOUT debug_probe. Sections below are verbatim except debug lines removed
+# and cross-section imports pointed at this module.
 # Added: simple persistent config with console prompts that override defaults and save to app_config.json
+# Heavy deps (selenium/uc, pyautogui, requests, telegram, tkinter) are imported lazily on first use.
+
+# ===== startup timing =====
+import os, json, sys, time, importlib, threading, logging
+
+_startup_t0 = time.perf_counter()
+_startup_last = _startup_t0
+STARTUP_TIMES: dict[str, float] = {}       # section -> ms spent at import
+LAZY_IMPORT_TIMES: dict[str, float] = {}   # module -> ms spent on first use
+
+def _startup_mark(section: str) -> None:
+    global _startup_last
+    now = time.perf_counter()
+    STARTUP_TIMES[section] = STARTUP_TIMES.get(section, 0.0) + (now - _startup_last) * 1000.0
+    _startup_last = now
+
+def _startup_pause() -> None:
+    """Drop the time since the last mark (e.g. waiting for console input) from the startup budget."""
+    global _startup_last
+    _startup_last = time.perf_counter()
+
+def import_time_report() -> str:
+    parts = [f"{name}={ms:.1f}ms" for name, ms in STARTUP_TIMES.items()]
+    total = sum(STARTUP_TIMES.values())
+    lazy = [f"{name}={ms:.1f}ms" for name, ms in LAZY_IMPORT_TIMES.items()]
+    s = f"total={total:.1f}ms ({', '.join(parts)})"
+    if lazy:
+        s += f"; lazy: {', '.join(lazy)}"
+    return s
+
+class _LazyModule:
+    """Module proxy: the real import happens on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._mod = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._mod is None:
+            with self._lock:
+                if self._mod is None:
+                    t = time.perf_counter()
+                    mod = importlib.import_module(self._name)
+                    ms = (time.perf_counter() - t) * 1000.0
+                    LAZY_IMPORT_TIMES[self._name] = ms
+                    logging.getLogger("startup").info("Lazy import %s: %.1f ms", self._name, ms)
+                    self._mod = mod
+        return self._mod
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
 
 # ===== config bootstrap =====
-import os, json, sys
 
 def _to_int_list(s: str, current: list[int]) -> list[int]:
     s = s.strip()
@@ -47,6 +99,30 @@ class _CONFIG:
     dest_chat_ids: list[int]
     allowed_users: list[int]
     chrome_version_main: int
+    prompt_on_start: bool
+    startup_budget_ms: float
+    tg_api_base: str
+    tg_fanout: str
+    tg_fanout_workers: int
+    notify_modes: dict[str, str]
+    screenshot: dict
+    waits: dict
+    presence_backend: str
+    genesys_api_base: str
+    genesys_token_key: str
+    keep_driver_warm: bool
+    prelaunch_lead_sec: int
+    chrome_mode: str
+    resource_report_sec: int
+    resource_report_tg: bool
+    agents: list
+    launch_concurrency: int
+    resume_on_restart: bool
+    weekly_schedule: list
+    tg_mode: str
+    tg_webhook: dict
+    metrics: dict
+    status_labels: dict[str, list[str]]
     path: str
 
     def __init__(self):
@@ -56,12 +132,85 @@ class _CONFIG:
         self.dest_chat_ids = [594953162, -1002993626250]
         self.allowed_users = [594953162]
         self.chrome_version_main = 140
+        self.prompt_on_start = True
+        self.startup_budget_ms = 1500.0
+        self.tg_api_base = "https://api.telegram.org"  # можно указать локальный fake Bot API
+        self.tg_fanout = "parallel"  # "parallel" | "serial" - рассылка по DEST_CHAT_IDS
+        self.tg_fanout_workers = 4
+        # event -> "text" | "photo" | "combined" (одно фото с подписью вместо текста + фото)
+        self.notify_modes = {
+            "shift_start": "combined",
+            "status": "combined",
+            "forced": "combined",
+            "error": "combined",
+            "stop": "photo",
+            "check": "text",  # кнопка Check status: текст из DOM; photo/combined - ещё и скрин рабочего стола
+        }
+        # format: png | jpeg | webp; max_dim: 0 = без уменьшения; region: "full" | "chrome" | [x, y, w, h]
+        # source: "desktop" (pyautogui) | "browser" (DevTools, клип вокруг аватара/статуса) | "both"
+        self.screenshot = {"format": "jpeg", "quality": 80, "png_level": 1, "max_dim": 2560, "region": "full",
+                           "source": "desktop", "clip_padding": 60}
+        # ожидания по условию вместо фиксированных sleep (секунды)
+        self.waits = {"poll": 0.05, "page_ready_timeout": 30.0, "menu_open_timeout": 1.2,
+                      "menu_stable_checks": 3, "menu_stable_delay": 0.06, "status_confirm_timeout": 5.0,
+                      "status_confirm_retries": 2}
+        self.presence_backend = "ui"  # "ui" - клики по меню | "api" - REST presence, при ошибке откат на UI
+        self.genesys_api_base = ""    # пусто = api.<домен из GENESYS_URL>; можно указать локальный mock
+        self.genesys_token_key = "purecloud.auth.token"  # ключ localStorage/sessionStorage с токеном Genesys SPA
+        self.keep_driver_warm = True  # Chrome живёт между запусками Test/Start/Stop
+        self.prelaunch_lead_sec = 90  # запланированный старт: Chrome/меню готовятся заранее, в срок - только клик
+        self.chrome_mode = "default"  # "default" | "low" - headless, без GPU/расширений, меньше процессов
+        self.resource_report_sec = 300  # RSS/CPU дерева процессов Chrome в лог, 0 = выкл (нужен psutil)
+        self.resource_report_tg = False
+        # доп. агенты: [{"name", "profile_dir", "dest_chat_ids", "intervals": {...}}], у каждого свой Chrome
+        self.agents = []
+        self.launch_concurrency = 2  # сколько агентов одновременно запускают Chrome/логинятся
+        self.resume_on_restart = True  # незавершённая смена из run_state.json продолжается после перезапуска
+        # недельный шаблон: [{"agent": "default", "days": ["mon", "tue"], "time": "09:00", "intervals": {...}}]
+        self.weekly_schedule = []
+        self.tg_mode = "polling"  # "polling" | "webhook" (встроенный HTTP-приёмник, см. tg_webhook)
+        # listen/port - где слушает встроенный HTTP-приёмник (за https-прокси или для локального теста)
+        # path - путь приёмника, POST только на него
+        # url - публичный https-адрес (пусто = setWebhook не вызывается: прокси/локальный тест)
+        # secret - X-Telegram-Bot-Api-Secret-Token, его же должен слать прокси/тест;
+        #          пусто допустимо только с url (тогда случайный на каждый запуск), без url - ошибка
+        self.tg_webhook = {"listen": "127.0.0.1", "port": 8443, "path": "/tg", "url": "", "secret": ""}
+        self.metrics = {"listen": "127.0.0.1", "port": 0}  # Prometheus /metrics, port 0 = выкл (/stats в TG работает всегда)
+        # статус -> подписи в виджете присутствия (без учёта регистра, подстрока); для локализованного UI
+        # добавьте свои, напр. "Break": ["Break", "Перерыв"]. Клик подтверждается только такой подписью
+        self.status_labels = {"Available": ["Available"], "Break": ["Break"], "Meal": ["Meal"]}
 
     def _merge(self, data: dict):
         self.bot_token = str(data.get("bot_token", self.bot_token))
         self.dest_chat_ids = list(data.get("dest_chat_ids", self.dest_chat_ids))
         self.allowed_users = list(data.get("allowed_users", self.allowed_users))
         self.chrome_version_main = int(data.get("chrome_version_main", self.chrome_version_main))
+        self.prompt_on_start = bool(data.get("prompt_on_start", self.prompt_on_start))
+        self.startup_budget_ms = float(data.get("startup_budget_ms", self.startup_budget_ms))
+        self.tg_api_base = str(data.get("tg_api_base", self.tg_api_base)).rstrip("/")
+        self.tg_fanout = str(data.get("tg_fanout", self.tg_fanout))
+        self.tg_fanout_workers = int(data.get("tg_fanout_workers", self.tg_fanout_workers))
+        self.notify_modes = {**self.notify_modes, **dict(data.get("notify_modes", {}))}
+        self.screenshot = {**self.screenshot, **dict(data.get("screenshot", {}))}
+        self.waits = {**self.waits, **dict(data.get("waits", {}))}
+        self.presence_backend = str(data.get("presence_backend", self.presence_backend))
+        self.genesys_api_base = str(data.get("genesys_api_base", self.genesys_api_base)).rstrip("/")
+        self.genesys_token_key = str(data.get("genesys_token_key", self.genesys_token_key))
+        self.keep_driver_warm = bool(data.get("keep_driver_warm", self.keep_driver_warm))
+        self.prelaunch_lead_sec = int(data.get("prelaunch_lead_sec", self.prelaunch_lead_sec))
+        self.chrome_mode = str(data.get("chrome_mode", self.chrome_mode))
+        self.resource_report_sec = int(data.get("resource_report_sec", self.resource_report_sec))
+        self.resource_report_tg = bool(data.get("resource_report_tg", self.resource_report_tg))
+        self.agents = [a for a in data.get("agents", self.agents) if isinstance(a, dict) and a.get("name")]
+        self.launch_concurrency = max(1, int(data.get("launch_concurrency", self.launch_concurrency)))
+        self.resume_on_restart = bool(data.get("resume_on_restart", self.resume_on_restart))
+        self.weekly_schedule = [w for w in data.get("weekly_schedule", self.weekly_schedule) if isinstance(w, dict)]
+        self.tg_mode = str(data.get("tg_mode", self.tg_mode))
+        self.tg_webhook = {**self.tg_webhook, **dict(data.get("tg_webhook", {}))}
+        self.metrics = {**self.metrics, **dict(data.get("metrics", {}))}
+        self.status_labels = {**self.status_labels,
+                              **{str(k): [str(x) for x in v] for k, v in dict(data.get("status_labels", {})).items()
+                                 if isinstance(v, list)}}
 
     def load(self):
         if os.path.isfile(self.path):
@@ -72,6 +221,15 @@ class _CONFIG:
             except Exception as e:
                 print(f"[config] Failed to load {self.path}: {e}")
 
+    def prompt_enabled(self) -> bool:
+        # Без консоли (служба, планировщик задач) input() только держит старт.
+        if not self.prompt_on_start:
+            return False
+        try:
+            return sys.stdin is not None and sys.stdin.isatty()
+        except Exception:
+            return False
+
     def prompt_always(self):
         print("\n=== Optional setup. Press Enter to keep current values ===")
         print(f"[config] File: {self.path}")
@@ -93,6 +251,30 @@ class _CONFIG:
                     "dest_chat_ids": self.dest_chat_ids,
                     "allowed_users": self.allowed_users,
                     "chrome_version_main": self.chrome_version_main,
+                    "prompt_on_start": self.prompt_on_start,
+                    "startup_budget_ms": self.startup_budget_ms,
+                    "tg_api_base": self.tg_api_base,
+                    "tg_fanout": self.tg_fanout,
+                    "tg_fanout_workers": self.tg_fanout_workers,
+                    "notify_modes": self.notify_modes,
+                    "screenshot": self.screenshot,
+                    "waits": self.waits,
+                    "presence_backend": self.presence_backend,
+                    "genesys_api_base": self.genesys_api_base,
+                    "genesys_token_key": self.genesys_token_key,
+                    "keep_driver_warm": self.keep_driver_warm,
+                    "prelaunch_lead_sec": self.prelaunch_lead_sec,
+                    "chrome_mode": self.chrome_mode,
+                    "resource_report_sec": self.resource_report_sec,
+                    "resource_report_tg": self.resource_report_tg,
+                    "agents": self.agents,
+                    "launch_concurrency": self.launch_concurrency,
+                    "resume_on_restart": self.resume_on_restart,
+                    "weekly_schedule": self.weekly_schedule,
+                    "tg_mode": self.tg_mode,
+                    "tg_webhook": self.tg_webhook,
+                    "metrics": self.metrics,
+                    "status_labels": self.status_labels,
                 }, f, ensure_ascii=False, indent=2)
             print(f"[config] Saved to {self.path}")
         except Exception as e:
@@ -100,9 +282,12 @@ class _CONFIG:
 
 CONFIG = _CONFIG()
 CONFIG.load()
-CONFIG.prompt_always()  # спрашиваем на каждом запуске
+if CONFIG.prompt_enabled():
+    _startup_mark("config")
+    CONFIG.prompt_always()  # спрашиваем на каждом запуске (если есть консоль)
+    _startup_pause()        # ожидание ввода не входит в startup_budget_ms
 CONFIG.save()
-git --version
+_startup_mark("config")
 
 
 
@@ -115,24 +300,39 @@ Core logic:
 - Run controller (start/stop, is_running)
 - Snapshot of Intervals for GUI/TG
 """
+import atexit
+import base64
+import functools
+import heapq
 import logging
+import queue
 import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Optional, Dict, Tuple, Iterable, List
-
-import requests
-import pyautogui
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import (
-    NoSuchElementException,
-    StaleElementReferenceException,
-    ElementClickInterceptedException,
-)
+from typing import Callable, Optional, Dict, Tuple, Iterable, List, TYPE_CHECKING
+
+# Loaded on first use: requests on the first Telegram call, pyautogui on the first
+# screenshot, uc/selenium when StatusBot._make_driver runs.
+requests = _LazyModule("requests")
+pyautogui = _LazyModule("pyautogui")
+uc = _LazyModule("undetected_chromedriver")
+psutil = _LazyModule("psutil")  # optional: only for Chrome resource reports
+_sel_exc = _LazyModule("selenium.common.exceptions")
+_sel_actions = _LazyModule("selenium.webdriver.common.action_chains")
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+class By:
+    # Same values as selenium.webdriver.common.by.By; importing that one pulls in all of selenium.webdriver.
+    ID = "id"
+    XPATH = "xpath"
+    CSS_SELECTOR = "css selector"
 
 # =========================
 # Config / logging
@@ -141,37 +341,743 @@ LOG_LEVEL = logging.INFO
 logging.basicConfig(level=LOG_LEVEL, format="[%(asctime)s] %(levelname)s: %(message)s", datefmt="%H:%M:%S")
 log = logging.getLogger("logic")
 
+# =========================
+# Metrics (latency histograms, WebDriver command counts; /stats and Prometheus endpoint)
+# =========================
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
+METRICS_RECENT = 200  # samples per operation kept for /stats percentiles
+
+class Metrics:
+    """Per-operation counters and histograms. WebDriver commands are attributed to the innermost
+    operation running on the calling thread ("other" outside any), so slow Chrome shows up apart
+    from slow Genesys (menu/status) and slow Telegram (tg_*)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._buckets: Dict[str, List[int]] = {}
+        self._sum: Dict[str, float] = {}
+        self._recent: Dict[str, "deque[float]"] = {}
+        self._results: Dict[Tuple[str, str], int] = {}
+        self._wd_count: Dict[Tuple[str, str], int] = {}
+        self._wd_sum: Dict[str, float] = {}
+
+    def current_op(self) -> str:
+        stack = getattr(self._local, "ops", None)
+        return stack[-1] if stack else "other"
+
+    def observe(self, op: str, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            b = self._buckets.setdefault(op, [0] * (len(METRICS_BUCKETS) + 1))
+            b[next((i for i, le in enumerate(METRICS_BUCKETS) if seconds <= le), len(METRICS_BUCKETS))] += 1
+            self._sum[op] = self._sum.get(op, 0.0) + seconds
+            self._recent.setdefault(op, deque(maxlen=METRICS_RECENT)).append(seconds)
+            key = (op, "ok" if ok else "error")
+            self._results[key] = self._results.get(key, 0) + 1
+
+    @contextmanager
+    def timed(self, op: str):
+        stack = getattr(self._local, "ops", None)
+        if stack is None:
+            stack = self._local.ops = []
+        stack.append(op)
+        t = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            stack.pop()
+            self.observe(op, time.perf_counter() - t, ok)
+
+    def webdriver_command(self, command: str, seconds: float) -> None:
+        op = self.current_op()
+        with self._lock:
+            self._wd_count[(op, command)] = self._wd_count.get((op, command), 0) + 1
+            self._wd_sum[command] = self._wd_sum.get(command, 0.0) + seconds
+
+    def prometheus(self) -> str:
+        def lbl(**kv) -> str:
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}"
+        out = ["# TYPE genesys_op_duration_seconds histogram"]
+        with self._lock:
+            for op, b in sorted(self._buckets.items()):
+                acc = 0
+                for le, n in zip(METRICS_BUCKETS + (float("inf"),), b):
+                    acc += n
+                    out.append(f"genesys_op_duration_seconds_bucket{lbl(op=op, le='+Inf' if le == float('inf') else le)} {acc}")
+                out.append(f"genesys_op_duration_seconds_sum{lbl(op=op)} {self._sum[op]:.6f}")
+                out.append(f"genesys_op_duration_seconds_count{lbl(op=op)} {acc}")
+            out.append("# TYPE genesys_op_total counter")
+            out += [f"genesys_op_total{lbl(op=op, result=r)} {n}" for (op, r), n in sorted(self._results.items())]
+            out.append("# TYPE genesys_webdriver_commands_total counter")
+            out += [f"genesys_webdriver_commands_total{lbl(op=op, command=c)} {n}"
+                    for (op, c), n in sorted(self._wd_count.items())]
+            out.append("# TYPE genesys_webdriver_command_seconds_total counter")
+            out += [f"genesys_webdriver_command_seconds_total{lbl(command=c)} {v:.6f}"
+                    for c, v in sorted(self._wd_sum.items())]
+        return "\n".join(out) + "\n"
+
+    def summary(self) -> List[str]:
+        """One line per operation: count, errors, p50/p95/max of recent samples, WebDriver commands."""
+        lines = []
+        with self._lock:
+            for op in sorted(self._buckets):
+                xs = sorted(self._recent[op])
+                pct = lambda q: xs[min(len(xs) - 1, int(q * len(xs)))] * 1000.0
+                n = self._results.get((op, "ok"), 0) + self._results.get((op, "error"), 0)
+                wd = sum(c for (o, _), c in self._wd_count.items() if o == op)
+                err = self._results.get((op, "error"), 0)
+                lines.append(f"{op}: n={n}{f' err={err}' if err else ''} p50 {pct(0.5):.0f} ms, "
+                             f"p95 {pct(0.95):.0f} ms, max {xs[-1] * 1000.0:.0f} ms"
+                             + (f", wd {wd / n:.1f}/call" if wd and n else ""))
+            other = sum(c for (o, _), c in self._wd_count.items() if o == "other")
+            if other:
+                lines.append(f"other webdriver commands: {other}")
+        return lines or ["No measurements yet."]
+
+metrics = Metrics()
+
+def metered(op: str):
+    """Decorator: time every call as operation `op`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.timed(op):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def instrument_driver(driver: WebDriver) -> WebDriver:
+    """Count/time every WebDriver command (execute_script, find_element, click...) of this driver."""
+    orig = driver.execute
+
+    def execute(driver_command, params=None):
+        t = time.perf_counter()
+        try:
+            return orig(driver_command, params)
+        finally:
+            metrics.webdriver_command(driver_command, time.perf_counter() - t)
+    driver.execute = execute
+    return driver
+
+def start_metrics_server() -> None:
+    """Prometheus text format on http://<listen>:<port>/metrics; port 0 = off."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    cfg = CONFIG.metrics
+    port = int(cfg.get("port", 0))
+    if port <= 0:
+        return
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((str(cfg.get("listen", "127.0.0.1")), port), _Handler)
+    except OSError as e:
+        log.error("Metrics endpoint not started (%s:%d): %s", cfg.get("listen"), port, e)
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    log.info("Metrics on http://%s:%d/metrics", *server.server_address[:2])
+
 # Telegram from CONFIG
 BOT_TOKEN = CONFIG.bot_token
 DEST_CHAT_IDS = CONFIG.dest_chat_ids
-API_BASE = f"https://api.telegram.org/bot{BOT_TOKEN}"
+API_BASE = f"{CONFIG.tg_api_base}/bot{BOT_TOKEN}"
+
+# One pooled keep-alive session for every call to API_BASE (no TCP+TLS handshake per message).
+TG_POOL_CONNECTIONS = 2   # per-host pools kept (api.telegram.org is the only host)
+TG_POOL_MAXSIZE = 8       # keep-alive connections per host; pool_block caps concurrency at this
+TG_CONNECT_TIMEOUT = 5
+
+_tg_session = None
+_tg_session_lock = threading.Lock()
+
+def tg_session():
+    global _tg_session
+    if _tg_session is None:
+        with _tg_session_lock:
+            if _tg_session is None:
+                s = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=TG_POOL_CONNECTIONS,
+                    pool_maxsize=TG_POOL_MAXSIZE,
+                    pool_block=True,
+                    max_retries=0,
+                )
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers["Connection"] = "keep-alive"
+                _tg_session = s
+    return _tg_session
+
+# =========================
+# Outbound notification queue
+# =========================
+# Callers only enqueue; a single dispatcher thread talks to the Bot API, keeps to
+# Telegram's rate limits, honours 429 retry_after, retries with backoff and spills
+# whatever it could not deliver to a journal that is replayed on the next start.
+TG_QUEUE_MAXSIZE = 200
+TG_MAX_ATTEMPTS = 5
+TG_BACKOFF_BASE = 1.0          # seconds, doubled per failed attempt
+TG_BACKOFF_MAX = 60.0
+TG_PER_CHAT_INTERVAL = 1.0     # Telegram: about one message per second per chat
+TG_GLOBAL_RATE = 25.0          # messages per second over all chats (limit is ~30)
+TG_JOURNAL_RECHECK = 60.0      # seconds between journal replays while running
+TG_JOURNAL_MAX_ATTEMPTS = 30   # attempts over all runs before a message is dead-lettered
+TG_JOURNAL_MAX_AGE = 24 * 3600.0  # seconds since a message was created before it is dead-lettered
+TG_JOURNAL_PATH = os.path.join(os.path.dirname(CONFIG.path), "tg_outbox.jsonl")
+TG_DEAD_LETTER_PATH = os.path.join(os.path.dirname(CONFIG.path), "tg_outbox.dead.jsonl")
+SHOT_MIME = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+SHOT_EXT = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+# Each message goes to all DEST_CHAT_IDS at once; bounded by the HTTP pool size.
+TG_FANOUT_PARALLEL = CONFIG.tg_fanout == "parallel"
+TG_FANOUT_WORKERS = max(1, min(CONFIG.tg_fanout_workers, TG_POOL_MAXSIZE))
+
+@dataclass
+class OutMsg:
+    method: str                      # "sendMessage" | "sendPhoto" | "sendMediaGroup"
+    chat_ids: List[int]
+    text: str = ""                   # message text or photo caption
+    photo: Optional[bytes] = None
+    file_id: Optional[str] = None    # set after the first upload; later chats reference it
+    photos: List[bytes] = field(default_factory=list)    # sendMediaGroup
+    file_ids: List[str] = field(default_factory=list)    # sendMediaGroup, after the first upload
+    fmt: str = "png"                 # image format of photo/photos
+    attempts: int = 0                # over all runs (journaled)
+    tries: int = 0                   # since this process picked it up (drives backoff, not journaled)
+    not_before: float = 0.0          # time.time() before which no retry is made
+    created: float = field(default_factory=time.time)
+
+    @property
+    def expired(self) -> bool:
+        return self.attempts >= TG_JOURNAL_MAX_ATTEMPTS or time.time() - self.created > TG_JOURNAL_MAX_AGE
+
+    @property
+    def uploaded(self) -> bool:
+        return bool(self.file_id or self.file_ids)
+
+    def take_file_ids(self, result: Optional[object]) -> bool:
+        """Remember file_id(s) from a successful upload and drop the bytes."""
+        if self.method == "sendMediaGroup":
+            ids = [_photo_file_id(m) for m in (result or [])]  # type: ignore[union-attr]
+            if len(ids) != len(self.photos) or not all(ids):
+                return False
+            self.file_ids, self.photos = ids, []
+            return True
+        fid = _photo_file_id(result)
+        if not fid:
+            return False
+        self.file_id, self.photo = fid, None
+        return True
+
+    def request(self, chat_id: int) -> tuple[dict, Optional[dict]]:
+        if self.method == "sendMediaGroup":
+            media, files = [], {}
+            for i in range(len(self.file_ids) or len(self.photos)):
+                if self.file_ids:
+                    item = {"type": "photo", "media": self.file_ids[i]}
+                else:
+                    item = {"type": "photo", "media": f"attach://p{i}"}
+                    files[f"p{i}"] = (f"screen{i}.{SHOT_EXT[self.fmt]}", self.photos[i], SHOT_MIME[self.fmt])
+                if i == 0 and self.text:
+                    item["caption"] = self.text
+                media.append(item)
+            return {"chat_id": chat_id, "media": json.dumps(media, ensure_ascii=False)}, files or None
+        if self.method == "sendPhoto":
+            if self.file_id:
+                return {"chat_id": chat_id, "caption": self.text, "photo": self.file_id}, None
+            return ({"chat_id": chat_id, "caption": self.text},
+                    {"photo": (f"screen.{SHOT_EXT[self.fmt]}", self.photo, SHOT_MIME[self.fmt])})
+        return {"chat_id": chat_id, "text": self.text}, None
+
+    def to_json(self) -> dict:
+        d = {
+            "method": self.method, "chat_ids": self.chat_ids, "text": self.text, "fmt": self.fmt,
+            "attempts": self.attempts, "created": self.created,
+        }
+        if self.file_id:
+            d["file_id"] = self.file_id
+        elif self.photo is not None:
+            d["photo"] = base64.b64encode(self.photo).decode("ascii")
+        if self.file_ids:
+            d["file_ids"] = self.file_ids
+        elif self.photos:
+            d["photos"] = [base64.b64encode(p).decode("ascii") for p in self.photos]
+        return d
+
+    @classmethod
+    def from_json(cls, d: dict) -> "OutMsg":
+        photo = d.get("photo")
+        return cls(
+            method=d["method"], chat_ids=[int(c) for c in d["chat_ids"]], text=d.get("text", ""),
+            photo=base64.b64decode(photo) if photo else None, file_id=d.get("file_id"),
+            photos=[base64.b64decode(p) for p in d.get("photos", [])], file_ids=list(d.get("file_ids", [])),
+            fmt=d.get("fmt", "png"), attempts=int(d.get("attempts", 0)), created=float(d.get("created", time.time())),
+        )
+
+@dataclass
+class TgResult:
+    chat_id: int
+    ok: bool
+    status: int = 0                  # HTTP status, 0 = no response
+    retry_after: float = 0.0
+    error: str = ""
+    result: Optional[object] = None
+    elapsed_ms: float = 0.0
+
+    @property
+    def retryable(self) -> bool:
+        return not self.ok and (self.status == 0 or self.status == 429 or self.status >= 500)
+
+def _tg_call(api_base: str, msg: OutMsg, chat_id: int) -> TgResult:
+    t = time.perf_counter()
+    res = _tg_post(api_base, msg, chat_id)
+    metrics.observe(f"tg_{msg.method}", time.perf_counter() - t, res.ok)
+    return res
+
+def _tg_post(api_base: str, msg: OutMsg, chat_id: int) -> TgResult:
+    data, files = msg.request(chat_id)
+    timeout = (TG_CONNECT_TIMEOUT, 30 if files else 10)
+    try:
+        r = tg_session().post(f"{api_base}/{msg.method}", data=data, files=files, timeout=timeout)
+    except Exception as e:
+        return TgResult(chat_id, False, error=str(e))
+    try:
+        body = r.json()
+    except ValueError:
+        body = {}
+    if r.status_code == 200 and body.get("ok"):
+        return TgResult(chat_id, True, 200, result=body.get("result"))
+    params = body.get("parameters") or {}
+    return TgResult(
+        chat_id, False, r.status_code,
+        retry_after=float(params.get("retry_after") or 0),
+        error=str(body.get("description") or r.text[:200]),
+    )
+
+def _photo_file_id(result: Optional[object]) -> Optional[str]:
+    # sendPhoto returns a Message; photo is a list of sizes, the largest (the original) comes last
+    try:
+        return result["photo"][-1]["file_id"]  # type: ignore[index]
+    except (TypeError, KeyError, IndexError):
+        return None
+
+class _RateLimiter:
+    """Books send slots per chat and globally; 429 pushes the chat's next slot out."""
+
+    def __init__(self, per_chat_interval: float, global_rate: float):
+        self._lock = threading.Lock()
+        self._per_chat = per_chat_interval
+        self._global = 1.0 / global_rate if global_rate > 0 else 0.0
+        self._next_chat: Dict[int, float] = {}
+        self._next_global = 0.0
+
+    def reserve(self, chat_id: int) -> float:
+        """Take the next free slot for chat_id; returns seconds to wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            t = max(now, self._next_chat.get(chat_id, 0.0), self._next_global)
+            self._next_chat[chat_id] = t + self._per_chat
+            self._next_global = t + self._global
+            return t - now
+
+    def penalize(self, chat_id: int, seconds: float) -> None:
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._next_chat[chat_id] = max(self._next_chat.get(chat_id, 0.0), until)
+
+class TgDispatcher:
+    def __init__(self, api_base: Optional[str] = None, journal_path: str = TG_JOURNAL_PATH,
+                 maxsize: int = TG_QUEUE_MAXSIZE, parallel: bool = TG_FANOUT_PARALLEL,
+                 workers: int = TG_FANOUT_WORKERS, dead_letter_path: str = TG_DEAD_LETTER_PATH):
+        self.api_base = api_base            # None -> API_BASE
+        self.journal_path = journal_path
+        self.dead_letter_path = dead_letter_path
+        self.parallel = parallel
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.last_results: List[TgResult] = []
+        self._q: "queue.Queue[OutMsg]" = queue.Queue(maxsize)
+        self._delayed: list[tuple[float, int, OutMsg]] = []   # heap of retries by not_before
+        self._seq = 0
+        self._limiter = _RateLimiter(TG_PER_CHAT_INTERVAL, TG_GLOBAL_RATE)
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._busy = False
+        self._inflight: Optional[OutMsg] = None
+        self._next_journal_check = 0.0
+        self.sent = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.dead = 0
+
+    # ---- lifecycle
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="tg_dispatcher")
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Stop the dispatcher thread and spill everything still pending to the journal, including
+        a message whose delivery did not finish within timeout (it may then arrive twice)."""
+        self._stop.set()
+        t = self._thread
+        if t and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout)
+        pending = []
+        with self._lock:
+            if self._inflight is not None:
+                pending.append(self._inflight)
+                self._inflight = None
+            pending.extend(m for _, _, m in self._delayed)
+            self._delayed.clear()
+        while True:
+            try:
+                pending.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        if pending:
+            self._spill(pending)
 
-def tg_send_text(text: str) -> None:
-    for chat_id in DEST_CHAT_IDS:
+    def submit(self, msg: OutMsg) -> None:
+        if not msg.chat_ids:
+            return
+        self.start()
         try:
-            requests.post(f"{API_BASE}/sendMessage", params={"chat_id": chat_id, "text": text}, timeout=10)
-        except Exception as e:
-            log.warning("tg_send_text failed: %s", e)
+            self._q.put_nowait(msg)
+        except queue.Full:
+            log.warning("TG queue full (%d), spilling to journal", self._q.maxsize)
+            self._spill([msg])
+
+    def wait_idle(self, timeout: float = 10.0) -> bool:
+        """Block until nothing is queued, delayed or in flight (for shutdown and tests)."""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            with self._lock:
+                idle = self._q.unfinished_tasks == 0 and not self._delayed and not self._busy
+            if idle:
+                return True
+            time.sleep(0.02)
+        return False
+
+    # ---- journal
+    def _append(self, path: str, msgs: List[OutMsg]) -> bool:
+        with self._journal_lock:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    for m in msgs:
+                        f.write(json.dumps(m.to_json(), ensure_ascii=False) + "\n")
+                return True
+            except Exception as e:
+                log.error("TG journal write failed (%s): %s", path, e)
+                return False
 
-def tg_send_photo_bytes(b: bytes, caption: str = "") -> None:
-    for chat_id in DEST_CHAT_IDS:
+    def _spill(self, msgs: List[OutMsg]) -> None:
+        """Journal msgs for a later replay; those out of attempts or too old go to the dead-letter file."""
+        dead = [m for m in msgs if m.expired]
+        live = [m for m in msgs if not m.expired]
+        if live and self._append(self.journal_path, live):
+            self.spilled += len(live)
+        if dead and self._append(self.dead_letter_path, dead):
+            self.dead += len(dead)
+            for m in dead:
+                log.warning("TG %s to %s dead-lettered after %d attempt(s), %.0f h old", m.method, m.chat_ids,
+                            m.attempts, (time.time() - m.created) / 3600.0)
+
+    def _replay_journal(self) -> int:
+        with self._journal_lock:
+            if not os.path.isfile(self.journal_path):
+                return 0
+            try:
+                with open(self.journal_path, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+                os.remove(self.journal_path)
+            except Exception as e:
+                log.error("TG journal read failed (%s): %s", self.journal_path, e)
+                return 0
+        msgs, overflow, dead = [], [], []
+        for line in lines:
+            try:
+                m = OutMsg.from_json(json.loads(line))
+            except Exception:
+                continue
+            (dead if m.expired else msgs).append(m)
+        if dead:
+            self._spill(dead)
+        for m in msgs:
+            try:
+                self._q.put_nowait(m)
+            except queue.Full:
+                overflow.append(m)
+        if overflow:
+            self._spill(overflow)
+        if msgs:
+            log.info("TG journal: replayed %d message(s)", len(msgs) - len(overflow))
+        return len(msgs) - len(overflow)
+
+    # ---- worker
+    def _next_msg(self) -> Optional[OutMsg]:
+        with self._lock:
+            if self._delayed and self._delayed[0][0] <= time.time():
+                self._busy = True
+                self._inflight = heapq.heappop(self._delayed)[2]
+                return self._inflight
+            wait = min(self._delayed[0][0] - time.time(), 0.5) if self._delayed else 0.5
+        try:
+            msg = self._q.get(timeout=max(wait, 0.0))
+        except queue.Empty:
+            return None
+        with self._lock:
+            self._busy = True
+            self._inflight = msg
+            self._q.task_done()
+        return msg
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if time.monotonic() >= self._next_journal_check:
+                self._next_journal_check = time.monotonic() + TG_JOURNAL_RECHECK
+                if self._q.empty():
+                    self._replay_journal()
+            msg = self._next_msg()
+            if msg is None:
+                continue
+            try:
+                self._deliver(msg)
+            except Exception as e:
+                log.warning("TG dispatcher error: %s", e)
+            finally:
+                with self._lock:
+                    self._busy = False
+                    self._inflight = None
+
+    def _send_one(self, api_base: str, msg: OutMsg, chat_id: int) -> TgResult:
+        if self._stop.wait(self._limiter.reserve(chat_id)):
+            return TgResult(chat_id, False, error="dispatcher stopped")
+        t = time.perf_counter()
+        res = _tg_call(api_base, msg, chat_id)
+        res.elapsed_ms = (time.perf_counter() - t) * 1000.0
+        return res
+
+    def fanout(self, msg: OutMsg, chat_ids: List[int]) -> List[TgResult]:
+        """Send msg to every chat (in parallel unless configured serial); one result per chat, in order."""
+        api_base = self.api_base or API_BASE
+        if not self.parallel or len(chat_ids) < 2:
+            return [self._send_one(api_base, msg, c) for c in chat_ids]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tg_fanout")
+        return list(self._pool.map(lambda c: self._send_one(api_base, msg, c), chat_ids))
+
+    def _deliver(self, msg: OutMsg) -> None:
+        retry: List[int] = []
+        retry_after = 0.0
+        t = time.perf_counter()
+        results: List[TgResult] = []
+        pending = list(msg.chat_ids)
+        if msg.method in ("sendPhoto", "sendMediaGroup") and not msg.uploaded and len(pending) > 1:
+            # Upload the bytes once; the other chats get the returned file_id(s).
+            api_base = self.api_base or API_BASE
+            while pending:
+                res = self._send_one(api_base, msg, pending.pop(0))
+                results.append(res)
+                if res.ok:
+                    msg.take_file_ids(res.result)
+                    break
+        if pending:
+            results.extend(self.fanout(msg, pending))
+        self.last_results = results
+        log.info("%s -> %d chat(s) in %.0f ms: %s", msg.method, len(results), (time.perf_counter() - t) * 1000.0,
+                 ", ".join(f"{r.chat_id}={'ok' if r.ok else r.status or 'err'}/{r.elapsed_ms:.0f}ms" for r in results))
+        for res in results:
+            chat_id = res.chat_id
+            if res.ok:
+                self.sent += 1
+                continue
+            if res.status == 429:
+                self._limiter.penalize(chat_id, res.retry_after)
+            if res.retryable:
+                retry.append(chat_id)
+                retry_after = max(retry_after, res.retry_after)
+                log.warning("%s to %s failed (%s %s), will retry", msg.method, chat_id, res.status, res.error)
+            else:
+                self.dropped += 1
+                log.warning("%s to %s rejected (%s %s), dropped", msg.method, chat_id, res.status, res.error)
+        if retry:
+            self._reschedule(msg, retry, retry_after)
+
+    def _reschedule(self, msg: OutMsg, chat_ids: List[int], retry_after: float) -> None:
+        msg.chat_ids = chat_ids
+        msg.attempts += 1
+        msg.tries += 1
+        if self._stop.is_set() or msg.tries >= TG_MAX_ATTEMPTS or msg.expired:
+            with self._lock:
+                if self._inflight is not msg and self._stop.is_set():
+                    return          # stop() has journaled it already
+                self._inflight = None
+            self._spill([msg])
+            return
+        backoff = min(TG_BACKOFF_MAX, TG_BACKOFF_BASE * 2 ** (msg.tries - 1))
+        msg.not_before = time.time() + max(backoff, retry_after)
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._delayed, (msg.not_before, self._seq, msg))
+
+tg_dispatcher = TgDispatcher()
+atexit.register(tg_dispatcher.stop)
+
+# chat_ids=None -> DEST_CHAT_IDS (agents with their own destinations pass theirs)
+def tg_send_text(text: str, chat_ids: Optional[List[int]] = None) -> None:
+    tg_dispatcher.submit(OutMsg("sendMessage", list(chat_ids or DEST_CHAT_IDS), text=text))
+
+def tg_send_photo_bytes(b: bytes, caption: str = "", fmt: str = "png", chat_ids: Optional[List[int]] = None) -> None:
+    tg_dispatcher.submit(OutMsg("sendPhoto", list(chat_ids or DEST_CHAT_IDS), text=caption, photo=b, fmt=fmt))
+
+def tg_send_photos(shots: List[bytes], caption: str = "", fmt: str = "png",
+                   chat_ids: Optional[List[int]] = None) -> None:
+    """One photo -> sendPhoto, several -> one media group (caption on the first item)."""
+    for i in range(0, len(shots), 10):  # Bot API: 2..10 items per group
+        chunk = shots[i:i + 10]
+        cap = caption if i == 0 else ""
+        if len(chunk) == 1:
+            tg_send_photo_bytes(chunk[0], caption=cap, fmt=fmt, chat_ids=chat_ids)
+        else:
+            tg_dispatcher.submit(OutMsg("sendMediaGroup", list(chat_ids or DEST_CHAT_IDS), text=cap,
+                                        photos=list(chunk), fmt=fmt))
+
+# =========================
+# Screenshot pipeline: grab on the caller, encode + send on a worker
+# =========================
+_shot_pool: Optional[ThreadPoolExecutor] = None
+_shot_pool_lock = threading.Lock()
+
+def shot_format() -> str:
+    fmt = str(CONFIG.screenshot.get("format", "png")).lower()
+    fmt = "jpeg" if fmt == "jpg" else fmt
+    return fmt if fmt in SHOT_MIME else "png"
+
+def shot_region(driver: Optional["WebDriver"] = None) -> Optional[tuple[int, int, int, int]]:
+    """Configured capture region: explicit [x, y, w, h], the Chrome window, or None for the full desktop."""
+    region = CONFIG.screenshot.get("region", "full")
+    if isinstance(region, (list, tuple)) and len(region) == 4:
+        return tuple(int(v) for v in region)  # type: ignore[return-value]
+    if region == "chrome" and driver is not None:
         try:
-            files = {"photo": ("screen.png", b, "image/png")}
-            data = {"chat_id": chat_id, "caption": caption}
-            requests.post(f"{API_BASE}/sendPhoto", data=data, files=files, timeout=30)
+            r = driver.get_window_rect()
+            # maximised windows on Windows report -8/-8
+            x, y = max(int(r["x"]), 0), max(int(r["y"]), 0)
+            return x, y, int(r["width"]) - (x - int(r["x"])), int(r["height"]) - (y - int(r["y"]))
         except Exception as e:
-            log.warning("tg_send_photo failed: %s", e)
+            log.warning("Chrome window rect unavailable (%s), capturing full desktop", e)
+    return None
+
+@metered("screen_grab")
+def grab_screen(region: Optional[tuple[int, int, int, int]] = None):
+    t = time.perf_counter()
+    img = pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
+    log.debug("Screen grab %dx%d in %.0f ms", img.width, img.height, (time.perf_counter() - t) * 1000.0)
+    return img
+
+@metered("encode")
+def encode_image(img, fmt: Optional[str] = None) -> bytes:
+    import io
+    cfg = CONFIG.screenshot
+    fmt = fmt or shot_format()
+    t = time.perf_counter()
+    src_size = img.size
+    max_dim = int(cfg.get("max_dim", 0) or 0)
+    if max_dim and max(img.size) > max_dim:
+        img.thumbnail((max_dim, max_dim))
+    buf = io.BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG", compress_level=int(cfg.get("png_level", 6)))
+    else:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if fmt == "jpeg":
+            img.save(buf, format="JPEG", quality=int(cfg.get("quality", 80)))
+        else:
+            img.save(buf, format="WEBP", quality=int(cfg.get("quality", 80)), method=2)
+    data = buf.getvalue()
+    log.info("Screenshot %dx%d -> %dx%d %s: %d KB in %.0f ms", src_size[0], src_size[1], img.width, img.height,
+             fmt, len(data) // 1024, (time.perf_counter() - t) * 1000.0)
+    return data
 
-def os_screenshot_and_send(caption: str) -> None:
+def _encode_and_send(shots: list, caption: str, chat_ids: Optional[List[int]] = None) -> None:
+    try:
+        fmt = shot_format()
+        data = [s if isinstance(s, bytes) else encode_image(s, fmt) for s in shots]
+        tg_send_photos(data, caption, fmt=fmt, chat_ids=chat_ids)
+    except Exception as e:
+        tg_send_text(f"{caption} (screenshot failed: {e})", chat_ids)
+
+def send_shots_async(shots: list, caption: str, chat_ids: Optional[List[int]] = None):
+    """Encode grabbed images (already-encoded bytes pass through) and send them, off the calling thread."""
+    global _shot_pool
+    with _shot_pool_lock:
+        if _shot_pool is None:
+            _shot_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shot_encode")
+    return _shot_pool.submit(_encode_and_send, shots, caption, chat_ids)
+
+@metered("screenshot")
+def os_screenshot_and_send(caption: str, region: Optional[tuple[int, int, int, int]] = None) -> None:
     try:
-        img = pyautogui.screenshot()
-        import io
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        tg_send_photo_bytes(buf.getvalue(), caption=caption)
+        send_shots_async([grab_screen(region or shot_region())], caption)
     except Exception as e:
         tg_send_text(f"{caption} (screenshot failed: {e})")
 
+# =========================
+# Event notifications (text / photo / combined per CONFIG.notify_modes)
+# =========================
+NOTIFY_MODES = ("text", "photo", "combined")
+
+def notify_mode(event: str) -> str:
+    mode = CONFIG.notify_modes.get(event, "combined")
+    return mode if mode in NOTIFY_MODES else "combined"
+
+def notify_event(event: str, text: str, caption: str, settle: float = 0.0, capture=None,
+                 chat_ids: Optional[List[int]] = None) -> None:
+    """
+    text     - text message for "text"/"combined"
+    caption  - caption of the screenshot in "photo" mode
+    settle   - pause before the screenshot so the UI shows the new state
+    capture  - callable returning a list of grabbed images or encoded bytes (default: one desktop shot)
+    chat_ids - destinations (default DEST_CHAT_IDS)
+    """
+    mode = notify_mode(event)
+    if mode == "text":
+        tg_send_text(text, chat_ids)
+        return
+    if mode == "combined":
+        caption = text
+    if settle > 0:
+        time.sleep(settle)
+    try:
+        shots = capture() if capture else [grab_screen(shot_region())]
+    except Exception as e:
+        tg_send_text(f"{caption} (screenshot failed: {e})", chat_ids)
+        return
+    send_shots_async(shots, caption, chat_ids)
+
 # =========================
 # Selenium / Genesys config
 # =========================
@@ -182,6 +1088,24 @@ CHROME_VERSION_MAIN = CONFIG.chrome_version_main
 RESTART_MAX_TRIES = 2
 RESTART_BACKOFF = 40  # seconds
 
+# chrome_mode = "low": shared thin clients, no visible window needed (screenshots come from DevTools)
+LOW_RESOURCE_CHROME_ARGS: List[str] = [
+    "--headless=new",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+    "--renderer-process-limit=2",
+    "--mute-audio",
+    "--window-size=1280,800",
+]
+
+def low_resource_mode() -> bool:
+    return CONFIG.chrome_mode == "low"
+
 class Status(Enum):
     AVAILABLE = "Available"
     BREAK = "Break"
@@ -193,6 +1117,13 @@ STATUS_SELECTORS: Dict[Status, str] = {
     Status.MEAL:      "li:nth-of-type(6) span.presence-label > span > span",
 }
 
+def status_labels(status: Status) -> List[str]:
+    """Widget labels that mean `status` (CONFIG.status_labels; the English name if not configured)."""
+    return [x for x in CONFIG.status_labels.get(status.value, []) if x] or [status.value]
+
+def label_matches(label: Optional[str], status: Status) -> bool:
+    return bool(label) and any(x.lower() in label.lower() for x in status_labels(status))
+
 AVATAR_XPATHS: List[str] = [
     "//*[contains(@id,'entity-image')]",
     "//*[@role='img' and @aria-label and string-length(@aria-label)>0]",
@@ -210,9 +1141,35 @@ BACK_TO_PRIMARY_SELECTORS: List[Tuple[By, str]] = [
     (By.CSS_SELECTOR, "nav:nth-of-type(1) ul > div gux-icon"),
 ]
 
+# Where the current presence is shown (first visible non-empty text wins);
+# the avatar's aria-label (AVATAR_XPATHS) is the fallback.
+PRESENCE_LABEL_SELECTORS: List[str] = [
+    "[class*='presence-label']:not(li *)",
+    "[class*='presence-status']",
+]
+
+# Time-in-status as the page shows it next to the presence (first visible non-empty text wins).
+PRESENCE_DURATION_SELECTORS: List[str] = [
+    "[class*='presence-duration']",
+    "[class*='status-duration']",
+    "[class*='time-in-status']",
+]
+
 # =========================
 # Intervals / plan
 # =========================
+@dataclass(frozen=True)
+class Segment:
+    status: Status
+    after: int         # seconds after the previous segment (or shift start)
+    duration: int = 0  # seconds in `status`, then back to Available; 0 = stay
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Segment":
+        st = str(d["status"])  # "BREAK" / "Break"
+        status = Status.__members__.get(st.upper()) or Status(st)
+        return cls(status, int(d.get("after", 0)), int(d.get("duration", 0)))
+
 @dataclass(frozen=True)
 class Intervals:
     first_break_after: int
@@ -223,8 +1180,22 @@ class Intervals:
     second_break_duration: int
     close_after: int
     start_on_shift: int = 180
+    segments: Tuple[Segment, ...] = ()  # non-empty -> replaces the break/lunch/break shape
+
+def intervals_from_dict(d: dict) -> Intervals:
+    return Intervals(**{**d, "segments": tuple(Segment.from_dict(x) for x in d.get("segments") or [])})
+
+def intervals_to_dict(iv: Intervals) -> dict:
+    d = {k: getattr(iv, k) for k in iv.__dataclass_fields__ if k != "segments"}
+    d["segments"] = [{"status": sg.status.value, "after": sg.after, "duration": sg.duration} for sg in iv.segments]
+    return d
 
 def sequence_plan(intervals: Intervals) -> Iterable[Tuple[Status, int, int]]:
+    if intervals.segments:
+        plan: List[Tuple[Status, int, int]] = []
+        for seg in intervals.segments:
+            plan += [(seg.status, seg.after, seg.duration), (Status.AVAILABLE, 0, 0)]
+        return plan
     return [
         (Status.BREAK, intervals.first_break_after, intervals.first_break_duration),
         (Status.AVAILABLE, 0, 0),
@@ -234,16 +1205,295 @@ def sequence_plan(intervals: Intervals) -> Iterable[Tuple[Status, int, int]]:
         (Status.AVAILABLE, 0, 0),
     ]
 
+@dataclass
+class Step:
+    kind: str          # "shift_start" | "status" | "ready" | "end"
+    status: Optional[Status]
+    at_mono: float     # deadline, time.monotonic() clock (what the runner waits on)
+    at_ts: float       # same deadline as an epoch timestamp (skew / re-anchoring; immune to DST)
+
+    @property
+    def at_wall(self) -> datetime:  # local time, for display only
+        return datetime.fromtimestamp(self.at_ts)
+
+TIMELINE_RECHECK_SEC = 30.0  # longest wait before a step's wall-clock deadline is looked at again
+TIMELINE_DRIFT_SEC = 2.0     # monotonic clock behind time.time() by more than this (suspend) re-anchors the timeline
+
+def compile_timeline(intervals: Intervals, t0_mono: float, t0_ts: float) -> List[Step]:
+    """Absolute deadlines for a whole run, counted from the Available click at t0 (t0_ts - epoch).
+    Shift end = shift start + close_after, but never before the last transition."""
+    def step(kind: str, status: Optional[Status], off: float) -> Step:
+        return Step(kind, status, t0_mono + off, t0_ts + off)
+
+    shift = float(max(intervals.start_on_shift, 0))
+    steps = [step("shift_start", Status.AVAILABLE, shift)]
+    off = shift
+    for status, wait_before, duration in sequence_plan(intervals):
+        off += max(wait_before, 0)
+        if status is Status.AVAILABLE:
+            continue
+        steps.append(step("status", status, off))
+        if duration > 0:
+            off += duration
+            steps.append(step("ready", Status.AVAILABLE, off))
+    steps.append(step("end", None, max(shift + intervals.close_after, off)))
+    return steps
+
 # =========================
 # Selenium helpers
 # =========================
+def wait_cfg(key: str) -> float:
+    return float(CONFIG.waits[key])
+
+def wait_until(predicate, timeout: float, poll: Optional[float] = None, default=None,
+               stop: Optional[threading.Event] = None):
+    """Poll predicate until it returns something truthy (returned) or timeout passes (default returned).
+    Exceptions from predicate count as "not yet". RunStopped as soon as `stop` is set."""
+    poll = wait_cfg("poll") if poll is None else poll
+    end = time.monotonic() + timeout
+    while True:
+        if stop is not None and stop.is_set():
+            raise RunStopped()
+        try:
+            v = predicate()
+            if v:
+                return v
+        except Exception:
+            pass
+        if time.monotonic() >= end:
+            return default
+        if stop is None:
+            time.sleep(poll)
+        elif stop.wait(poll):
+            raise RunStopped()
+
+# Current presence text from the root document and same-origin frames in one round trip.
+_PRESENCE_LABEL_FN = """
+function presenceDocs() {
+  const docs = [document];
+  for (const f of document.querySelectorAll('iframe, frame')) {
+    try { if (f.contentDocument) docs.push(f.contentDocument); } catch (e) {}
+  }
+  return docs;
+}
+function readPresenceLabel(sels, xps) {
+  const docs = presenceDocs();
+  for (const d of docs) {
+    for (const s of sels) {
+      for (const el of d.querySelectorAll(s)) {
+        const t = (el.innerText || el.textContent || '').trim();
+        if (t && el.getClientRects().length) return t;
+      }
+    }
+  }
+  for (const d of docs) {
+    for (const xp of xps) {
+      const el = d.evaluate(xp, d, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+      const t = el && el.getAttribute('aria-label');
+      if (t) return t.trim();
+    }
+  }
+  return null;
+}
+"""
+_PRESENCE_LABEL_JS = _PRESENCE_LABEL_FN + "return readPresenceLabel(arguments[0], arguments[1]);"
+
+# Installs (once per page) a MutationObserver that records every presence label change
+# as {t: Date.now(), label} in window.__presence.events; returns {label, now} (now = browser clock).
+_PRESENCE_OBSERVER_JS = _PRESENCE_LABEL_FN + """
+const [sels, xps] = arguments;
+const w = window;
+if (!w.__presence) {
+  const st = {events: [], last: readPresenceLabel(sels, xps), waiters: []};
+  w.__presence = st;
+  const onMutation = () => {
+    const label = readPresenceLabel(sels, xps);
+    if (label === st.last) return;
+    st.last = label;
+    const ev = {t: Date.now(), label: label};
+    st.events.push(ev);
+    if (st.events.length > 50) st.events.shift();
+    st.waiters.slice().forEach(fn => fn(ev));
+  };
+  const obs = new MutationObserver(onMutation);
+  const opts = {subtree: true, childList: true, characterData: true, attributes: true,
+                attributeFilter: ['aria-label', 'class']};
+  for (const d of presenceDocs()) { try { obs.observe(d, opts); } catch (e) {} }
+}
+return {label: w.__presence.last, now: Date.now()};
+"""
+
+# Async: resolves with the first recorded change since sinceMs to one of the expected labels,
+# or {ok: false} on timeout. A change to any other label (wrong menu item hit) does not count.
+_PRESENCE_WAIT_JS = """
+const [expects, sinceMs, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const st = window.__presence;
+if (!st) return done({ok: false, label: null, reason: 'observer missing'});
+const matches = l => !!l && expects.some(x => l.toLowerCase().includes(x.toLowerCase()));
+const hit = st.events.find(e => e.t >= sinceMs && matches(e.label));
+if (hit) return done({ok: true, t: hit.t, label: hit.label});
+// already showing the target (shift starts on Available, force of the current status): no mutation will come
+if (matches(st.last)) return done({ok: true, t: sinceMs, label: st.last});
+let timer = null;
+const waiter = ev => {
+  if (!matches(ev.label)) return;
+  clearTimeout(timer);
+  st.waiters.splice(st.waiters.indexOf(waiter), 1);
+  done({ok: true, t: ev.t, label: ev.label});
+};
+st.waiters.push(waiter);
+timer = setTimeout(() => {
+  st.waiters.splice(st.waiters.indexOf(waiter), 1);
+  done({ok: matches(st.last), t: Date.now(), label: st.last});
+}, timeoutMs);
+"""
+
+PRESENCE_WAIT_SLICE = 0.25  # seconds per observer wait call; Stop is checked between calls
+
+def read_presence_label(driver: WebDriver) -> Optional[str]:
+    driver.switch_to.default_content()
+    return driver.execute_script(_PRESENCE_LABEL_JS, PRESENCE_LABEL_SELECTORS, AVATAR_XPATHS)
+
+# Label + time in status in one round trip: the page's own duration text if it shows one,
+# else the time of the last label change recorded by the presence observer (if installed).
+_PRESENCE_READ_JS = _PRESENCE_LABEL_FN + """
+const [sels, xps, durSels] = arguments;
+const label = readPresenceLabel(sels, xps);
+let duration = null;
+outer:
+for (const d of presenceDocs()) {
+  for (const s of durSels) {
+    for (const el of d.querySelectorAll(s)) {
+      const t = (el.innerText || el.textContent || '').trim();
+      if (t && el.getClientRects().length) { duration = t; break outer; }
+    }
+  }
+}
+const st = window.__presence;
+const ev = st && st.events.length ? st.events[st.events.length - 1] : null;
+return {label: label, duration: duration, since: ev && ev.label === label ? ev.t : null};
+"""
+
+@dataclass
+class PresenceReading:
+    label: Optional[str]
+    duration: Optional[str] = None    # time in status as shown by the page
+    since: Optional[datetime] = None  # last label change (observer / our own click)
+    elapsed_ms: float = 0.0
+
+    def text(self) -> str:
+        if not self.label:
+            return "Presence: unknown"
+        if self.duration:
+            return f"Presence: {self.label} ({self.duration})"
+        if self.since:
+            return (f"Presence: {self.label} for {fmt_td(datetime.now() - self.since)} "
+                    f"(since {self.since.strftime('%H:%M:%S')})")
+        return f"Presence: {self.label}"
+
+def read_presence(driver: WebDriver) -> PresenceReading:
+    t = time.perf_counter()
+    driver.switch_to.default_content()
+    r = driver.execute_script(_PRESENCE_READ_JS, PRESENCE_LABEL_SELECTORS, AVATAR_XPATHS,
+                              PRESENCE_DURATION_SELECTORS) or {}
+    since = datetime.fromtimestamp(r["since"] / 1000.0) if r.get("since") else None
+    return PresenceReading(r.get("label"), r.get("duration"), since, (time.perf_counter() - t) * 1000.0)
+
+# Menu / avatar / back-button state of the root document and every same-origin frame in one call.
+# Cross-origin frames are listed in "blocked" and probed separately.
+_PROBE_JS = """
+const [statusSels, avatarXps, backLocs] = arguments;
+function visible(el) {
+  if (!el) return false;
+  const r = el.getBoundingClientRect();
+  if (!r.width || !r.height) return false;
+  const cs = getComputedStyle(el);
+  return cs.visibility !== 'hidden' && cs.display !== 'none';
+}
+function find(d, by, loc) {
+  try {
+    if (by === 'xpath') return d.evaluate(loc, d, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return d.querySelector(loc);
+  } catch (e) { return null; }
+}
+function probe(d, frame) {
+  return {
+    frame: frame,
+    items: statusSels.map(s => visible(find(d, 'css selector', s))),
+    avatar: avatarXps.findIndex(xp => !!find(d, 'xpath', xp)),
+    back: backLocs.some(([by, loc]) => !!find(d, by, loc)),
+  };
+}
+const docs = [probe(document, null)];
+const blocked = [];
+const frameEls = Array.from(document.querySelectorAll('iframe, frame'));
+frameEls.forEach((f, i) => {
+  let d = null;
+  try { d = f.contentDocument; } catch (e) {}
+  if (d) docs.push(probe(d, i)); else blocked.push(i);
+});
+return {docs: docs, blocked: blocked, frames: frameEls};
+"""
+
+@dataclass
+class ProbeState:
+    menu_open: bool = False
+    menu_frame: Optional[int] = None
+    visible: List[Status] = field(default_factory=list)
+    avatar_xpath: Optional[str] = None
+    avatar_frame: Optional[int] = None
+    back: bool = False
+    back_frame: Optional[int] = None
+    frame_els: list = field(default_factory=list)
+
+def probe_page(driver: WebDriver) -> ProbeState:
+    """One execute_script per document (one in total when all frames are same-origin)."""
+    args = (list(STATUS_SELECTORS.values()), AVATAR_XPATHS, [[by, loc] for by, loc in BACK_TO_PRIMARY_SELECTORS])
+    driver.switch_to.default_content()
+    raw = driver.execute_script(_PROBE_JS, *args)
+    docs = list(raw["docs"])
+    frame_els = list(raw["frames"])
+    for idx in raw["blocked"]:
+        try:
+            driver.switch_to.default_content()
+            driver.switch_to.frame(frame_els[idx])
+            sub = driver.execute_script(_PROBE_JS, *args)["docs"][0]
+            sub["frame"] = idx
+            docs.append(sub)
+        except Exception:
+            continue
+    driver.switch_to.default_content()
+
+    st = ProbeState(frame_els=frame_els)
+    statuses = list(STATUS_SELECTORS.keys())
+    for d in docs:
+        if not st.menu_open and any(d["items"]):
+            st.menu_open = True
+            st.menu_frame = d["frame"]
+            st.visible = [statuses[i] for i, v in enumerate(d["items"]) if v]
+        if st.avatar_xpath is None and d["avatar"] >= 0:
+            st.avatar_xpath = AVATAR_XPATHS[d["avatar"]]
+            st.avatar_frame = d["frame"]
+        if not st.back and d["back"]:
+            st.back = True
+            st.back_frame = d["frame"]
+    return st
+
+def page_ready(driver: WebDriver, cache: Optional[FrameCache] = None) -> bool:
+    driver.switch_to.default_content()
+    if driver.execute_script("return document.readyState") != "complete":
+        return False
+    return any(find_in_any_frame(driver, By.XPATH, xp, cache, f"avatar:{xp}")[1] is not None
+               for xp in AVATAR_XPATHS)
+
 def robust_click_element(driver: WebDriver, el, retries: int = 5, pause: float = 0.2) -> bool:
     for _ in range(retries):
         try:
             try:
                 el.click()
                 return True
-            except (ElementClickInterceptedException, StaleElementReferenceException):
+            except (_sel_exc.ElementClickInterceptedException, _sel_exc.StaleElementReferenceException):
                 driver.execute_script("arguments[0].scrollIntoView({block:'center',inline:'center'});", el)
                 time.sleep(0.05)
                 try:
@@ -256,10 +1506,66 @@ def robust_click_element(driver: WebDriver, el, retries: int = 5, pause: float =
             time.sleep(pause)
     return False
 
-def find_in_any_frame(driver: WebDriver, by: By, locator: str) -> tuple[Optional[int], Optional[object]]:
+class FrameCache:
+    """
+    Per-session map: logical target ("menu", "back", "avatar:<xpath>") -> frame it was last found in
+    (None = root document). Lookups try that frame first; clear() on navigation or stale frames.
+    """
+
+    def __init__(self):
+        self._frames: Dict[str, Tuple[Optional[int], Optional[object]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._frames
+
+    def index(self, key: str) -> Optional[int]:
+        return self._frames[key][0] if key in self._frames else None
+
+    def put(self, key: str, index: Optional[int], frame_el: Optional[object]) -> None:
+        self._frames[key] = (index, frame_el)
+
+    def forget(self, key: str) -> None:
+        self._frames.pop(key, None)
+
+    def clear(self) -> None:
+        self._frames.clear()
+
+    def switch(self, driver: WebDriver, key: str) -> bool:
+        """Switch into the cached frame for key. False if unknown; stale frame -> whole cache dropped."""
+        if key not in self._frames:
+            return False
+        _, frame_el = self._frames[key]
+        driver.switch_to.default_content()
+        if frame_el is None:
+            return True
+        try:
+            driver.switch_to.frame(frame_el)
+            return True
+        except (_sel_exc.StaleElementReferenceException, _sel_exc.NoSuchFrameException):
+            log.debug("Frame cache: stale frame for %s, clearing", key)
+            self.clear()
+            driver.switch_to.default_content()
+            return False
+
+def find_in_any_frame(driver: WebDriver, by: By, locator: str, cache: Optional[FrameCache] = None,
+                      key: Optional[str] = None) -> tuple[Optional[int], Optional[object]]:
+    key = key or f"{by}:{locator}"
+    if cache is not None and cache.switch(driver, key):
+        try:
+            el = driver.find_element(by, locator)
+            cache.hits += 1
+            return cache.index(key), el
+        except Exception:
+            cache.forget(key)
+    if cache is not None:
+        cache.misses += 1
     driver.switch_to.default_content()
     try:
         el = driver.find_element(by, locator)
+        if cache is not None:
+            cache.put(key, None, None)
         return None, el
     except Exception:
         pass
@@ -269,6 +1575,8 @@ def find_in_any_frame(driver: WebDriver, by: By, locator: str) -> tuple[Optional
             driver.switch_to.default_content()
             driver.switch_to.frame(fr)
             el = driver.find_element(by, locator)
+            if cache is not None:
+                cache.put(key, idx, fr)
             return idx, el
         except Exception:
             continue
@@ -297,8 +1605,7 @@ def send_escape_and_clear(driver: WebDriver, esc_times: int = 1) -> None:
         except Exception:
             continue
 
-def nav_back_to_primary_if_present(driver: WebDriver) -> bool:
-    driver.switch_to.default_content()
+def _click_back_in_current_frame(driver: WebDriver) -> bool:
     for by, loc in BACK_TO_PRIMARY_SELECTORS:
         try:
             el = driver.find_element(by, loc)
@@ -307,28 +1614,40 @@ def nav_back_to_primary_if_present(driver: WebDriver) -> bool:
                 return True
         except Exception:
             pass
+    return False
+
+def nav_back_to_primary_if_present(driver: WebDriver, cache: Optional[FrameCache] = None) -> bool:
+    if cache is not None and cache.switch(driver, "back"):
+        if _click_back_in_current_frame(driver):
+            cache.hits += 1
+            driver.switch_to.default_content()
+            return True
+        cache.forget("back")
+    driver.switch_to.default_content()
+    if _click_back_in_current_frame(driver):
+        if cache is not None:
+            cache.put("back", None, None)
+        return True
     frames = driver.find_elements(By.CSS_SELECTOR, "iframe, frame")
-    for fr in frames:
+    for idx, fr in enumerate(frames):
         try:
             driver.switch_to.default_content()
             driver.switch_to.frame(fr)
-            for by, loc in BACK_TO_PRIMARY_SELECTORS:
-                try:
-                    el = driver.find_element(by, loc)
-                    if robust_click_element(driver, el, retries=2, pause=0.1):
-                        time.sleep(0.1)
-                        return True
-                except Exception:
-                    pass
+            if _click_back_in_current_frame(driver):
+                if cache is not None:
+                    cache.put("back", idx, fr)
+                return True
         except Exception:
             continue
     driver.switch_to.default_content()
     return False
 
-def _anchor_on_menu(driver: WebDriver, menu_frame_index: Optional[int]) -> bool:
+def _anchor_on_menu(driver: WebDriver, menu_frame_index: Optional[int], cache: Optional[FrameCache] = None) -> bool:
     try:
         driver.switch_to.default_content()
-        if menu_frame_index is not None:
+        if cache is not None and cache.switch(driver, "menu"):
+            pass
+        elif menu_frame_index is not None:
             frames = driver.find_elements(By.CSS_SELECTOR, "iframe, frame")
             if 0 <= menu_frame_index < len(frames):
                 driver.switch_to.frame(frames[menu_frame_index])
@@ -336,7 +1655,7 @@ def _anchor_on_menu(driver: WebDriver, menu_frame_index: Optional[int]) -> bool:
             try:
                 el = driver.find_element(By.CSS_SELECTOR, css)
                 if el.is_displayed():
-                    ActionChains(driver).move_to_element(el).pause(0.05).perform()
+                    _sel_actions.ActionChains(driver).move_to_element(el).pause(0.05).perform()
                     driver.execute_script("arguments[0].focus && arguments[0].focus();", el)
                     time.sleep(0.08)
                     return True
@@ -346,28 +1665,465 @@ def _anchor_on_menu(driver: WebDriver, menu_frame_index: Optional[int]) -> bool:
         pass
     return False
 
+# Viewport rect of arguments[0], its border widths (an iframe's content starts inside them)
+# and the scroll offset of the document it lives in.
+_RECT_JS = """
+const e = arguments[0], r = e.getBoundingClientRect();
+return {x: r.left, y: r.top, w: r.width, h: r.height,
+        bx: e.clientLeft, by: e.clientTop, sx: window.scrollX, sy: window.scrollY};
+"""
+
+def element_page_rect(driver: WebDriver, frame_index: Optional[int], el) -> Dict[str, float]:
+    """Rect of el (found inside frame frame_index, None = root) in root-page coordinates. Leaves driver in root.
+    Inside a frame: iframe viewport rect + iframe border + el's rect in the frame's viewport; only the
+    root document's scroll is added (the frame's own scroll is already in el's viewport rect)."""
+    r = driver.execute_script(_RECT_JS, el)
+    driver.switch_to.default_content()
+    x, y = r["x"], r["y"]
+    root = r
+    if frame_index is not None:
+        frames = driver.find_elements(By.CSS_SELECTOR, "iframe, frame")
+        root = driver.execute_script(_RECT_JS, frames[frame_index])
+        x += root["x"] + root["bx"]
+        y += root["y"] + root["by"]
+    return {"x": x + root["sx"], "y": y + root["sy"], "w": r["w"], "h": r["h"]}
+
+def cdp_clip_screenshot(driver: WebDriver, rect: Dict[str, float], padding: float, fmt: str, quality: int) -> bytes:
+    params = {
+        "format": fmt,
+        "clip": {
+            "x": max(rect["x"] - padding, 0), "y": max(rect["y"] - padding, 0),
+            "width": rect["w"] + 2 * padding, "height": rect["h"] + 2 * padding, "scale": 1,
+        },
+        "captureBeyondViewport": True,
+    }
+    if fmt != "png":
+        params["quality"] = quality
+    res = driver.execute_cdp_cmd("Page.captureScreenshot", params)
+    return base64.b64decode(res["data"])
+
+# =========================
+# Genesys presence REST API (alternative to clicking the menu)
+# =========================
+# The logged-in SPA's token, read from the one storage entry Genesys keeps it under
+# (CONFIG.genesys_token_key); nothing else in web storage is ever sent as a Bearer token.
+_TOKEN_JS = """
+const key = arguments[0], out = [];
+function add(v) { if (typeof v === 'string' && v.length > 20 && !out.includes(v)) out.push(v); }
+function read(store) {
+  const v = store.getItem(key);
+  if (v === null) return;
+  try {
+    const o = JSON.parse(v);
+    if (o && typeof o === 'object') { add(o.access_token || o.accessToken || o.token); return; }
+    if (typeof o === 'string') { add(o); return; }
+  } catch (e) {}
+  add(v);
+}
+try { read(window.localStorage); } catch (e) {}
+try { read(window.sessionStorage); } catch (e) {}
+return out;
+"""
+
+def genesys_api_base() -> str:
+    if CONFIG.genesys_api_base:
+        return CONFIG.genesys_api_base
+    from urllib.parse import urlparse
+    host = urlparse(GENESYS_URL).netloc
+    return "https://" + (host.replace("apps.", "api.", 1) if host.startswith("apps.") else f"api.{host}")
+
+def browser_token_candidates(driver: WebDriver) -> List[str]:
+    driver.switch_to.default_content()
+    if not CONFIG.genesys_token_key:
+        return []
+    return list(driver.execute_script(_TOKEN_JS, CONFIG.genesys_token_key) or [])
+
+class PresenceApiError(Exception):
+    pass
+
+class PresenceApi:
+    """Sets presence via PATCH /api/v2/users/{id}/presences/PURECLOUD using the browser session's token."""
+
+    def __init__(self, base_url: str, token_candidates, timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self._token_candidates = token_candidates   # callable -> list of tokens to try
+        self.timeout = timeout
+        self._session = None
+        self._token: Optional[str] = None
+        self._user_id: Optional[str] = None
+        self._definitions: Dict[Status, str] = {}
+
+    def _http(self):
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def _call(self, method: str, path: str, token: Optional[str] = None, **kw):
+        token = token or self._token
+        r = self._http().request(method, f"{self.base_url}{path}", timeout=self.timeout,
+                                 headers={"Authorization": f"Bearer {token}"}, **kw)
+        if r.status_code == 401 and token == self._token:
+            self._token = None
+        if r.status_code >= 400:
+            raise PresenceApiError(f"{method} {path}: HTTP {r.status_code} {r.text[:200]}")
+        return r.json() if r.content else {}
+
+    def _ensure_auth(self) -> None:
+        if self._token:
+            return
+        for cand in self._token_candidates():
+            try:
+                me = self._call("GET", "/api/v2/users/me", token=cand)
+            except PresenceApiError:
+                continue
+            self._token, self._user_id = cand, me["id"]
+            return
+        raise PresenceApiError("no usable token in the browser session")
+
+    def definition_id(self, status: Status) -> str:
+        if status not in self._definitions:
+            self._ensure_auth()
+            data = self._call("GET", "/api/v2/presencedefinitions", params={"pageSize": 100})
+            for d in data.get("entities", []):
+                for st in Status:
+                    if d.get("systemPresence", "").lower() == st.value.lower():
+                        # primary definitions win over secondary ones with the same system presence
+                        if st not in self._definitions or d.get("primary"):
+                            self._definitions[st] = d["id"]
+            if status not in self._definitions:
+                raise PresenceApiError(f"no presence definition for {status.value}")
+        return self._definitions[status]
+
+    def set_status(self, status: Status) -> None:
+        """PATCH, then confirm: the response body (or a fresh GET) must carry the requested definition."""
+        self._ensure_auth()
+        def_id = self.definition_id(status)
+        path = f"/api/v2/users/{self._user_id}/presences/PURECLOUD"
+        res = self._call("PATCH", path, json={"presenceDefinition": {"id": def_id}})
+        got = (res.get("presenceDefinition") or {}).get("id")
+        if got is None:
+            got = (self._call("GET", path).get("presenceDefinition") or {}).get("id")
+        if got != def_id:
+            raise PresenceApiError(f"presence is {got!r} after PATCH, expected {status.value} ({def_id})")
+
+# =========================
+# Driver manager: one warm Chrome session per profile, reused between runs
+# =========================
+def chrome_processes(driver: WebDriver) -> list:
+    """psutil processes of this driver's browser (browser_pid from uc, else chromedriver's children)."""
+    pid = getattr(driver, "browser_pid", None)
+    root = psutil.Process(pid) if pid else psutil.Process(driver.service.process.pid)
+    procs = [root] + root.children(recursive=True)
+    return procs if pid else procs[1:] or procs
+
+class ChromeResourceMonitor:
+    """Periodic RSS/CPU report for the manager's Chrome process tree."""
+
+    def __init__(self, manager: "DriverManager", interval: float):
+        self.manager = manager
+        self.interval = interval
+        self.last: Optional[Dict[str, float]] = None
+        self._procs: Dict[int, object] = {}   # keeps Process objects so cpu_percent() has a baseline
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._procs = {}
+        self._thread = threading.Thread(target=self._run, daemon=True, name="chrome_resources")
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        t, self._thread = self._thread, None
+        if t and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout)
+
+    def sample(self, driver: WebDriver) -> Dict[str, float]:
+        rss, cpu, alive = 0, 0.0, {}
+        for p in chrome_processes(driver):
+            p = self._procs.get(p.pid, p)
+            try:
+                rss += p.memory_info().rss
+                cpu += p.cpu_percent(None)
+                alive[p.pid] = p
+            except psutil.Error:
+                continue
+        self._procs = alive
+        self.last = {"rss_mb": rss / 1048576.0, "cpu_pct": cpu, "procs": len(alive)}
+        return self.last
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            driver = self.manager.peek()
+            if driver is None:
+                continue
+            try:
+                r = self.sample(driver)
+            except ImportError:
+                log.warning("psutil is not installed, Chrome resource reports disabled")
+                return
+            except Exception as e:
+                log.debug("Chrome resource sample failed: %s", e)
+                continue
+            msg = (f"Chrome ({os.path.basename(self.manager.profile_dir)}): RSS {r['rss_mb']:.0f} MB, "
+                   f"CPU {r['cpu_pct']:.0f}%, {r['procs']:.0f} processes")
+            log.info(msg)
+            if CONFIG.resource_report_tg:
+                tg_send_text(msg)
+
+DRIVER_HANDOFF_TIMEOUT = 30.0  # seconds a new run waits for the previous owner to give Chrome back
+
+class DriverManager:
+    def __init__(self, profile_dir: str):
+        self.profile_dir = profile_dir
+        self.driver: Optional[WebDriver] = None
+        self.owner: Optional[object] = None
+        self.launches = 0
+        self.monitor = ChromeResourceMonitor(self, CONFIG.resource_report_sec)
+        self._lock = threading.Condition(threading.RLock())  # notified when the owner gives the session back
+
+    @staticmethod
+    def healthy(driver: WebDriver) -> bool:
+        try:
+            if not driver.window_handles:
+                return False
+            driver.switch_to.default_content()
+            return driver.execute_script("return document.readyState") is not None
+        except Exception:
+            return False
+
+    def _held_by_other(self, owner: object) -> bool:
+        """The session belongs to another run whose runner thread is still alive (maybe blocked
+        inside a WebDriver call after Stop); a dead runner that never released it does not count."""
+        cur = self.owner
+        if cur is None or cur is owner:
+            return False
+        runner = getattr(cur, "_runner", None)
+        return runner is not None and runner.is_alive()
+
+    def acquire(self, owner: object, make, stop: Optional[threading.Event] = None) -> tuple[WebDriver, bool]:
+        """Hand out the warm session (health-checked) or launch one via make(); returns (driver, fresh).
+        Waits up to DRIVER_HANDOFF_TIMEOUT for a previous owner to release it, so two runs never
+        drive one Chrome; RunStopped if `stop` is set meanwhile."""
+        with self._lock:
+            end = time.monotonic() + DRIVER_HANDOFF_TIMEOUT
+            while self._held_by_other(owner):
+                if stop is not None and stop.is_set():
+                    raise RunStopped()
+                left = end - time.monotonic()
+                if left <= 0:
+                    raise RuntimeError(f"Chrome ({self.profile_dir}) is still in use by the previous run")
+                self._lock.wait(min(left, 0.1))
+            if self.driver is not None and not self.healthy(self.driver):
+                log.warning("Chrome session (%s) is dead, relaunching", self.profile_dir)
+                self._quit()
+            fresh = self.driver is None
+            if fresh:
+                self.driver = make()
+                self.launches += 1
+                self.monitor.start()
+            else:
+                log.info("Reusing warm Chrome session (%s)", self.profile_dir)
+            self.owner = owner
+            return self.driver, fresh
+
+    def release(self, owner: object) -> None:
+        with self._lock:
+            if self.owner is owner:
+                self.owner = None
+                if not CONFIG.keep_driver_warm:
+                    self._quit()
+                self._lock.notify_all()
+
+    def discard(self) -> None:
+        with self._lock:
+            self._quit()
+
+    def peek(self) -> Optional[WebDriver]:
+        return self.driver
+
+    def _quit(self) -> None:
+        self.monitor.stop()
+        d, self.driver, self.owner = self.driver, None, None
+        self._lock.notify_all()
+        if d is not None:
+            try:
+                d.quit()
+            except Exception:
+                pass
+
+_driver_managers: Dict[str, DriverManager] = {}
+_driver_managers_lock = threading.Lock()
+
+def driver_manager_for(profile_dir: str) -> DriverManager:
+    with _driver_managers_lock:
+        if profile_dir not in _driver_managers:
+            _driver_managers[profile_dir] = DriverManager(profile_dir)
+        return _driver_managers[profile_dir]
+
+def shutdown_drivers() -> None:
+    for m in list(_driver_managers.values()):
+        m.discard()
+
+atexit.register(shutdown_drivers)
+
+def on_genesys(driver: WebDriver) -> bool:
+    from urllib.parse import urlparse
+    try:
+        return urlparse(driver.current_url).netloc == urlparse(GENESYS_URL).netloc
+    except Exception:
+        return False
+
+DEFAULT_AGENT = "default"  # the agent driven by the GUI and the plain Telegram buttons
+PRESENCE_READ_TIMEOUT = 5.0  # seconds to wait for the runner to read presence for another thread
+_launch_slots = threading.BoundedSemaphore(CONFIG.launch_concurrency)
+
+class RunStopped(Exception):
+    """Raised inside a run once Stop was requested (the warm driver is not killed to interrupt it)."""
+
+class StatusNotConfirmed(Exception):
+    """The page never showed the requested status; the run retries from its last checkpoint."""
+
 def now_ms() -> float:
     return time.time() * 1000.0
 
+# =========================
+# Run checkpoint (resume after a crash / retry / restart)
+# =========================
+RUN_STATE_PATH = os.path.join(os.path.dirname(CONFIG.path), "run_state.json")
+_run_state_lock = threading.Lock()
+
+def _read_run_state() -> Dict[str, dict]:
+    try:
+        with open(RUN_STATE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        log.error("Run state read failed (%s): %s", RUN_STATE_PATH, e)
+        return {}
+
+def _write_run_state(data: Dict[str, dict]) -> None:
+    tmp = RUN_STATE_PATH + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, RUN_STATE_PATH)  # never leaves a half-written file behind
+    except Exception as e:
+        log.error("Run state write failed (%s): %s", RUN_STATE_PATH, e)
+
+def save_checkpoint(agent: str, cp: Optional[dict]) -> None:
+    """cp=None drops the agent's checkpoint (shift over / stopped by hand)."""
+    with _run_state_lock:
+        data = _read_run_state()
+        if cp is None:
+            if data.pop(agent, None) is None:
+                return
+        else:
+            data[agent] = cp
+        _write_run_state(data)
+
+def load_checkpoints() -> Dict[str, dict]:
+    with _run_state_lock:
+        return _read_run_state()
+
 # =========================
 # StatusBot
 # =========================
 class StatusBot:
-    def __init__(self, intervals: Intervals):
+    def __init__(self, intervals: Intervals, profile_dir: str = CHROME_PROFILE_DIR,
+                 start_at: Optional[datetime] = None, name: str = DEFAULT_AGENT,
+                 chat_ids: Optional[List[int]] = None):
         self.driver: WebDriver | None = None
+        self.name = name
+        self.chat_ids = chat_ids  # None -> DEST_CHAT_IDS
+        self.current_status: Optional[Status] = None
+        self.started_at: Optional[datetime] = None
+        self.start_at = start_at  # scheduled instant of the first Available click (pre-launched run)
+        self.profile_dir = profile_dir
+        self.drivers = driver_manager_for(profile_dir)
         self.menu_frame_index: Optional[int] = None
+        self.frames = FrameCache()
+        self.presence_api: Optional[PresenceApi] = None
+        self.last_confirm_ms: Optional[float] = None
+        self.last_click_ms: Optional[float] = None
         self.intervals = intervals
-        self.manual_stop = False
+        self._stop = threading.Event()
+        self._wake = threading.Event()   # set on stop / posted command / reschedule
+        self._start_lock = threading.Lock()  # reschedule vs. the runner committing to the Available click
+        self._commands: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._runner: Optional[threading.Thread] = None
+        self._start_done = False
+        self.t0: Optional[Tuple[float, float]] = None  # (monotonic, epoch) of the Available click
+        self._next_step = 0  # timeline index to run next (checkpointed)
         self._open_in_progress = False
         self._last_open_ts = 0.0
         self._open_debounce_ms = 850.0
 
     # ---- Selenium setup
+    @metered("chrome_launch")
     def _make_driver(self) -> WebDriver:
         options = uc.ChromeOptions()
-        options.add_argument(f"--user-data-dir={CHROME_PROFILE_DIR}")
+        options.add_argument(f"--user-data-dir={self.profile_dir}")
+        if low_resource_mode():
+            for arg in LOW_RESOURCE_CHROME_ARGS:
+                options.add_argument(arg)
         driver = uc.Chrome(options=options, version_main=CHROME_VERSION_MAIN)
-        return driver
+        return instrument_driver(driver)
+
+    # ---- messages (prefixed with the agent name when several agents share a chat)
+    def _tag(self, text: str) -> str:
+        return text if self.name == DEFAULT_AGENT else f"[{self.name}] {text}"
+
+    def _say(self, text: str) -> None:
+        tg_send_text(self._tag(text), self.chat_ids)
+
+    def _notify(self, event: str, text: str, caption: str, settle: float = 0.0) -> None:
+        notify_event(event, self._tag(text), self._tag(caption), settle=settle, capture=self._capture,
+                     chat_ids=self.chat_ids)
+
+    @property
+    def manual_stop(self) -> bool:
+        return self._stop.is_set()
+
+    @manual_stop.setter
+    def manual_stop(self, value: bool) -> None:
+        if value:
+            self._stop.set()
+            self._wake.set()
+        else:
+            self._stop.clear()
+
+    def _check_stop(self) -> None:
+        if self._stop.is_set():
+            raise RunStopped()
+
+    # ---- runner thread commands (WebDriver is used from the runner thread only)
+    def _on_other_thread(self) -> bool:
+        r = self._runner
+        return r is not None and r.is_alive() and r is not threading.current_thread()
+
+    def post(self, fn: Callable[[], None]) -> None:
+        """Queue fn for the runner; it runs at the runner's next wait, which is woken right away."""
+        self._commands.put(fn)
+        self._wake.set()
+
+    def _run_commands(self) -> None:
+        while True:
+            try:
+                fn = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn()
+            except RunStopped:
+                raise
+            except Exception as e:
+                log.error("[%s] Command failed: %s", self.name, e)
 
     # ---- checks
     def session_alive(self) -> bool:
@@ -379,34 +2135,28 @@ class StatusBot:
         except Exception:
             return False
 
+    def probe(self) -> ProbeState:
+        """Page state in one round trip; primes the frame cache for the follow-up actions."""
+        st = probe_page(self.driver)
+
+        def _remember(key: str, idx: Optional[int]) -> None:
+            self.frames.put(key, idx, st.frame_els[idx] if idx is not None else None)
+
+        if st.menu_open:
+            self.menu_frame_index = st.menu_frame
+            _remember("menu", st.menu_frame)
+        if st.avatar_xpath is not None:
+            _remember(f"avatar:{st.avatar_xpath}", st.avatar_frame)
+        if st.back:
+            _remember("back", st.back_frame)
+        return st
+
     def _is_menu_open(self) -> bool:
-        candidates = list(STATUS_SELECTORS.values())
-        self.driver.switch_to.default_content()
-        for css in candidates:
-            try:
-                if self.driver.find_element(By.CSS_SELECTOR, css).is_displayed():
-                    self.menu_frame_index = None
-                    return True
-            except Exception:
-                pass
-        frames = self.driver.find_elements(By.CSS_SELECTOR, "iframe, frame")
-        for idx, fr in enumerate(frames):
-            try:
-                self.driver.switch_to.default_content()
-                self.driver.switch_to.frame(fr)
-                for css in candidates:
-                    try:
-                        if self.driver.find_element(By.CSS_SELECTOR, css).is_displayed():
-                            self.menu_frame_index = idx
-                            return True
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-        self.driver.switch_to.default_content()
-        return False
+        return self.probe().menu_open
 
     def _switch_to_menu_frame(self) -> None:
+        if self.frames.switch(self.driver, "menu"):
+            return
         self.driver.switch_to.default_content()
         if self.menu_frame_index is not None:
             frames = self.driver.find_elements(By.CSS_SELECTOR, "iframe, frame")
@@ -422,63 +2172,153 @@ class StatusBot:
             self._last_open_ts = t
         return ok
 
-    def _open_via_avatar_once(self) -> bool:
-        send_escape_and_clear(self.driver, esc_times=1)
-        nav_back_to_primary_if_present(self.driver)
+    def _open_via_avatar_once(self, state: Optional[ProbeState] = None, clear_first: bool = True) -> bool:
+        if clear_first:
+            send_escape_and_clear(self.driver, esc_times=1)
+        state = state or self.probe()
+        if state.back:
+            nav_back_to_primary_if_present(self.driver, self.frames)
+        if state.avatar_xpath is None:
+            return False
 
-        target_el = None
-        for xp in AVATAR_XPATHS:
-            frame_idx, el = find_in_any_frame(self.driver, By.XPATH, xp)
-            if el:
-                log.info("Нашёл аватар по %s (iframe=%s)", xp, frame_idx if frame_idx is not None else "root")
-                target_el = el
-                break
+        xp = state.avatar_xpath
+        frame_idx, target_el = find_in_any_frame(self.driver, By.XPATH, xp, self.frames, f"avatar:{xp}")
         if not target_el:
             return False
+        log.info("Нашёл аватар по %s (iframe=%s)", xp, frame_idx if frame_idx is not None else "root")
 
         if not self._avatar_click_debounced(target_el):
             return False
 
-        end = time.time() + 1.2
-        while time.time() < end:
-            if self._is_menu_open():
-                _anchor_on_menu(self.driver, self.menu_frame_index)
-                return True
-            time.sleep(0.05)
+        if wait_until(self._is_menu_open, wait_cfg("menu_open_timeout"), stop=self._stop):
+            _anchor_on_menu(self.driver, self.menu_frame_index, self.frames)
+            return True
         return False
 
-    def _ensure_menu_open_retry(self, stabilize_checks: int = 3, check_delay: float = 0.18) -> bool:
+    @metered("menu_open")
+    def _ensure_menu_open_retry(self, stabilize_checks: Optional[int] = None,
+                                check_delay: Optional[float] = None) -> bool:
+        stabilize_checks = int(CONFIG.waits["menu_stable_checks"]) if stabilize_checks is None else stabilize_checks
+        check_delay = wait_cfg("menu_stable_delay") if check_delay is None else check_delay
+        poll = wait_cfg("poll")
         stable = 0
+        failed_opens = 0
         while True:
-            if not self._is_menu_open():
+            self._check_stop()
+            state = self.probe()
+            if not state.menu_open:
+                stable = 0
                 if self._open_in_progress:
-                    time.sleep(0.1)
-                    stable = 0
+                    self._stop.wait(poll)
                     continue
                 try:
                     self._open_in_progress = True
-                    ok = self._open_via_avatar_once()
-                    if not ok:
-                        time.sleep(0.25)
-                    stable = 0
+                    # Escape/clear only after a failed attempt: a clean page needs just the avatar click.
+                    if self._open_via_avatar_once(state, clear_first=failed_opens > 0):
+                        failed_opens = 0
+                    else:
+                        failed_opens += 1
+                        self._stop.wait(poll)
                 finally:
                     self._open_in_progress = False
                 continue
 
-            _anchor_on_menu(self.driver, self.menu_frame_index)
-            time.sleep(check_delay)
-            if self._is_menu_open():
-                stable += 1
-                if stable >= stabilize_checks:
-                    log.info("Меню статусов открыто стабильно")
-                    return True
-            else:
-                stable = 0
+            if stabilize_checks <= 0:
+                return True  # already anchored (pre-launch): no extra round trips before the click
+            if stable == 0:
+                _anchor_on_menu(self.driver, self.menu_frame_index, self.frames)
+            stable += 1
+            if stable >= stabilize_checks:
+                log.info("Меню статусов открыто стабильно")
+                return True
+            self._stop.wait(check_delay)
 
-    def _select_status(self, status: Status) -> bool:
-        self._ensure_menu_open_retry()
-        self._switch_to_menu_frame()
+    def _read_label(self) -> Optional[str]:
+        try:
+            return read_presence_label(self.driver)
+        except Exception:
+            return None
+
+    def _status_applied(self, status: Status) -> bool:
+        label = self._read_label()
+        if label is not None:
+            return label_matches(label, status)
+        return not self._is_menu_open()
+
+    def _arm_presence_observer(self) -> Tuple[Optional[str], Optional[float]]:
+        """Make sure the MutationObserver is installed; returns (label before the click, browser Date.now())."""
+        try:
+            self.driver.switch_to.default_content()
+            r = self.driver.execute_script(_PRESENCE_OBSERVER_JS, PRESENCE_LABEL_SELECTORS, AVATAR_XPATHS) or {}
+            return r.get("label"), r.get("now")
+        except Exception as e:
+            log.debug("Presence observer not installed: %s", e)
+            return None, None
+
+    def _wait_status_applied(self, status: Status, before: Optional[str], click_ms: float,
+                             armed_ms: Optional[float] = None) -> bool:
+        """click_ms - our clock (polling fallback); armed_ms - browser clock just before the click,
+        so the observer path compares browser timestamps only."""
+        timeout = wait_cfg("status_confirm_timeout")
+        self.driver.switch_to.default_content()
+        res = None
+        if before is not None and armed_ms is not None:
+            # short slices, so Stop is seen between them; every slice looks back to armed_ms,
+            # so a change that lands between two slices is still found
+            end = time.monotonic() + timeout
+            try:
+                self.driver.set_script_timeout(PRESENCE_WAIT_SLICE + 5)
+                while True:
+                    self._check_stop()
+                    left = end - time.monotonic()
+                    res = self.driver.execute_async_script(_PRESENCE_WAIT_JS, status_labels(status), armed_ms,
+                                                           int(max(min(left, PRESENCE_WAIT_SLICE), 0) * 1000))
+                    if res.get("ok") or res.get("reason") or left <= PRESENCE_WAIT_SLICE:
+                        break
+            except RunStopped:
+                raise
+            except Exception as e:
+                res = None
+                log.debug("Presence observer wait failed (%s), polling instead", e)
+        if res is not None:
+            ok = bool(res.get("ok"))
+            if ok:
+                self.last_confirm_ms = max(float(res["t"]) - armed_ms, 0.0)
+                log.info("Статус %s подтверждён за %.0f ms (%s)", status.value, self.last_confirm_ms, res.get("label"))
+            elif res.get("label"):
+                log.warning("Статус %s: в виджете %r, ожидалось %s", status.value, res.get("label"),
+                            "/".join(status_labels(status)))
+        else:
+            # no label on the page (or no observer): poll label / menu state
+            ok = bool(wait_until(lambda: self._status_applied(status), timeout, stop=self._stop))
+            if ok:
+                self.last_confirm_ms = now_ms() - click_ms
+        if not ok:
+            log.warning("Статус %s не подтвердился за %.1fs", status.value, timeout)
+        self.driver.switch_to.default_content()
+        return ok
 
+    @metered("page_ready")
+    def _wait_page_ready(self) -> None:
+        timeout = wait_cfg("page_ready_timeout")
+        if not wait_until(lambda: page_ready(self.driver, self.frames), timeout, poll=max(wait_cfg("poll"), 0.25),
+                          stop=self._stop):
+            log.warning("Страница не готова за %.0fs, продолжаю", timeout)
+
+    def _set_status_via_api(self, status: Status) -> bool:
+        if self.presence_api is None:
+            self.presence_api = PresenceApi(genesys_api_base(), lambda: browser_token_candidates(self.driver))
+        t = time.perf_counter()
+        try:
+            self.presence_api.set_status(status)
+        except Exception as e:
+            log.warning("Presence API: %s не удалось (%s), переключаюсь на UI", status.value, e)
+            return False
+        log.info("Статус выбран через API: %s (%.0f ms)", status.value, (time.perf_counter() - t) * 1000.0)
+        return True
+
+    def _click_status_item(self, status: Status) -> bool:
+        self._switch_to_menu_frame()
         css_inner = STATUS_SELECTORS[status]
         try:
             el = self.driver.find_element(By.CSS_SELECTOR, css_inner)
@@ -489,7 +2329,7 @@ class StatusBot:
         try:
             try:
                 btn = el.find_element(By.XPATH, "./ancestor::button[1]")
-            except NoSuchElementException:
+            except _sel_exc.NoSuchElementException:
                 btn = el
             if not robust_click_element(self.driver, btn, retries=8, pause=0.2):
                 log.error("Не удалось кликнуть по кнопке статуса %s", status.value)
@@ -497,214 +2337,604 @@ class StatusBot:
         except Exception as e:
             log.error("Ошибка при выборе статуса %s: %s", status.value, e)
             return False
-
-        time.sleep(0.3)
-        log.info("Статус выбран: %s", status.value)
         return True
 
+    def _set_status(self, status: Status, stabilize_checks: Optional[int] = None) -> None:
+        if not self._select_status(status, stabilize_checks):
+            raise StatusNotConfirmed(f"status {status.value} not confirmed")
+
+    @metered("select_status")
+    def _select_status(self, status: Status, stabilize_checks: Optional[int] = None) -> bool:
+        self._check_stop()
+        if CONFIG.presence_backend == "api":
+            self.last_click_ms = now_ms()
+            if self._set_status_via_api(status):
+                self.current_status = status
+                return True
+        attempts = 1 + int(CONFIG.waits.get("status_confirm_retries", 2))
+        for attempt in range(1, attempts + 1):
+            self._ensure_menu_open_retry(stabilize_checks)
+            before, armed_ms = self._arm_presence_observer()
+            click_ms = self.last_click_ms = now_ms()
+            if not self._click_status_item(status):
+                return False
+            if self._wait_status_applied(status, before, click_ms, armed_ms):
+                self.current_status = status
+                log.info("[%s] Статус выбран: %s", self.name, status.value)
+                return True
+            if attempt < attempts:
+                log.warning("Повторяю выбор статуса %s (%d/%d)", status.value, attempt + 1, attempts)
+        log.error("Статус %s так и не подтвердился", status.value)
+        return False
+
+    def capture_presence_clip(self) -> bytes:
+        """DevTools screenshot clipped around the avatar/presence widget; needs no desktop session."""
+        for xp in AVATAR_XPATHS:
+            frame_idx, el = find_in_any_frame(self.driver, By.XPATH, xp, self.frames, f"avatar:{xp}")
+            if el:
+                break
+        else:
+            raise RuntimeError("avatar element not found")
+        cfg = CONFIG.screenshot
+        rect = element_page_rect(self.driver, frame_idx, el)
+        t = time.perf_counter()
+        data = cdp_clip_screenshot(self.driver, rect, float(cfg.get("clip_padding", 60)), shot_format(),
+                                   int(cfg.get("quality", 80)))
+        log.info("Browser clip %dx%d: %d KB in %.0f ms", rect["w"], rect["h"], len(data) // 1024,
+                 (time.perf_counter() - t) * 1000.0)
+        return data
+
+    def _capture(self) -> list:
+        source = CONFIG.screenshot.get("source", "desktop")
+        if low_resource_mode() and source == "desktop":
+            source = "browser"  # headless Chrome is not on the desktop
+        shots: list = []
+        if source in ("browser", "both") and self.driver:
+            try:
+                shots.append(self.capture_presence_clip())
+            except Exception as e:
+                log.warning("Browser clip failed (%s), using desktop screenshot", e)
+        if source in ("desktop", "both") or not shots:
+            shots.append(grab_screen(shot_region(self.driver)))
+        return shots
+
     # ---- Public API on running driver
+    def read_presence(self, timeout: float = PRESENCE_READ_TIMEOUT) -> PresenceReading:
+        """Presence label + time in status; from another thread it runs on the runner at once."""
+        if self._on_other_thread():
+            fut: Future = Future()
+
+            def _read() -> None:
+                try:
+                    fut.set_result(self._read_presence_now())
+                except Exception as e:
+                    fut.set_exception(e)
+            self.post(_read)
+            return fut.result(timeout)
+        return self._read_presence_now()
+
+    def _read_presence_now(self) -> PresenceReading:
+        if not self.driver:
+            raise RuntimeError("driver not started")
+        r = read_presence(self.driver)
+        cur = self.current_status
+        if r.since is None and r.label and cur and self.last_click_ms and label_matches(r.label, cur):
+            r.since = datetime.fromtimestamp(self.last_click_ms / 1000.0)
+        return r
+
     def force_status(self, status: Status):
+        if self._on_other_thread():
+            self.post(lambda: self.force_status(status))
+            return
         if not self.driver:
-            tg_send_text("Драйвер не запущен.")
+            self._say("Драйвер не запущен.")
             return
         try:
-            self._ensure_menu_open_retry()
-            self._select_status(status)
-            tg_send_text(f"Forced: {status.value}")
-            time.sleep(3)
-            os_screenshot_and_send(f"{status.value} (forced)")
+            self._set_status(status)
+            self._notify("forced", f"Forced: {status.value}", f"{status.value} (forced)")
+        except StatusNotConfirmed as e:
+            self._notify("error", f"Force failed: {e}", "Error screen")
         except Exception as e:
-            tg_send_text(f"Force status error: {e}")
+            self._say(f"Force status error: {e}")
 
     def request_stop(self):
-        self.manual_stop = True
+        self.manual_stop = True  # wakes the runner; it gives the driver back on its way out
+        if not CONFIG.keep_driver_warm and self.driver:
+            self.drivers.discard()  # old behaviour: killing Chrome also breaks a blocked WebDriver call
+        if not self._on_other_thread():
+            self.close()
+
+    def reschedule(self, start_at: datetime, intervals: Optional[Intervals] = None) -> bool:
+        """Move the Available click of a pre-launched run, with the new Start's intervals if given
+        (the timeline is compiled after the click); False once the run has committed to the click."""
+        with self._start_lock:
+            if self._start_done or self.manual_stop:
+                return False
+            self.start_at = start_at
+            if intervals is not None:
+                self.intervals = intervals
+        self._wake.set()
+        return True
+
+    def close(self):
+        """Give the driver back to the manager (kept warm unless keep_driver_warm is off)."""
+        if self.driver is not None:
+            self.driver = None
+            self.drivers.release(self)
+
+    def _open_session(self) -> None:
+        # Chrome launch + login is the expensive part: at most launch_concurrency agents at a time
+        while not _launch_slots.acquire(timeout=0.05):
+            self._check_stop()
         try:
-            if self.driver:
-                self.driver.quit()
+            self.driver, fresh = self.drivers.acquire(self, self._make_driver, stop=self._stop)
+            if fresh or not on_genesys(self.driver):
+                self.driver.get(GENESYS_URL)
+                self.frames.clear()
+                if fresh and not low_resource_mode():
+                    self.driver.maximize_window()
+            self._wait_page_ready()
         finally:
-            self.driver = None
+            _launch_slots.release()
+
+    def _wait(self, timeout: float) -> None:
+        """Block up to timeout; returns early on stop/command/reschedule (RunStopped on stop)."""
+        self._check_stop()
+        self._run_commands()
+        if timeout > 0 and self._wake.wait(timeout):
+            self._wake.clear()
+        self._check_stop()
+        self._run_commands()
+
+    def _sleep(self, seconds: float) -> None:
+        end = time.monotonic() + seconds
+        while True:
+            left = end - time.monotonic()
+            if left <= 0:
+                self._check_stop()
+                return
+            self._wait(left)
+
+    def _sleep_to(self, step: Step, timeline: List[Step]) -> bool:
+        """Wait for a step's deadline, re-checking time.time() at least every TIMELINE_RECHECK_SEC.
+        time.monotonic() stands still while the machine is suspended, so when it falls behind the
+        epoch clock the remaining deadlines are moved back onto it. True if that happened.
+        Epoch time does not move on DST; a clock stepped back is not a suspend and is ignored."""
+        moved = False
+        while True:
+            left = step.at_mono - time.monotonic()
+            drift = (step.at_ts - time.time()) - left
+            if drift < -TIMELINE_DRIFT_SEC:
+                log.warning("[%s] Monotonic clock is %+.1fs off wall time (suspend?); re-anchoring timeline",
+                            self.name, -drift)
+                for st in timeline[self._next_step:]:
+                    st.at_mono += drift
+                self.t0 = (self.t0[0] + drift, self.t0[1])
+                moved = True
+                continue
+            if left <= 0:
+                self._check_stop()
+                return moved
+            self._wait(min(left, TIMELINE_RECHECK_SEC))
+
+    def _sleep_until(self) -> None:
+        """Wait for self.start_at (re-read on every wake, so reschedule moves it); short sleeps
+        for the last half second, so the wake-up lands on time."""
+        while True:
+            left = (self.start_at - datetime.now()).total_seconds()
+            if left <= 0:
+                return
+            if left > 0.6:
+                self._wait(min(left - 0.5, 30.0))
+            else:
+                time.sleep(min(left, 0.005))
+                self._check_stop()
+
+    def _prepare_start(self) -> None:
+        """Pre-launch: everything except the final click, done before start_at."""
+        if CONFIG.presence_backend == "api":
+            if self.presence_api is None:
+                self.presence_api = PresenceApi(genesys_api_base(), lambda: browser_token_candidates(self.driver))
+            try:
+                self.presence_api.definition_id(Status.AVAILABLE)
+                return
+            except Exception as e:
+                log.warning("Presence API pre-warm failed (%s), anchoring the menu instead", e)
+        self._ensure_menu_open_retry()
+        self._arm_presence_observer()
+
+    def _start_available(self) -> None:
+        with self._start_lock:
+            immediate = self.start_at is None or self.start_at <= datetime.now()
+            if immediate:
+                self._start_done = True
+        if immediate:
+            self._set_status(Status.AVAILABLE)
+            self.t0 = (time.monotonic(), time.time())
+            self._checkpoint()
+            self._say("Login successfully. Status set to Available.")
+            return
+        self._prepare_start()
+        lead = (self.start_at - datetime.now()).total_seconds()
+        log.info("Pre-launch ready %.1fs before %s", lead, self.start_at.strftime("%H:%M:%S"))
+        while True:
+            self._sleep_until()
+            with self._start_lock:
+                if self.start_at <= datetime.now():  # not moved by a reschedule in the meantime
+                    self._start_done = True
+                    break
+        self._set_status(Status.AVAILABLE, stabilize_checks=0)
+        start_ts = self.start_at.timestamp()
+        self.t0 = (time.monotonic() - (time.time() - start_ts), start_ts)
+        self._checkpoint()
+        offset = (self.last_click_ms or now_ms()) - self.start_at.timestamp() * 1000.0
+        log.info("Available clicked %+.0f ms from target %s", offset, self.start_at.strftime("%H:%M:%S"))
+        self._say(f"Status set to Available at {self.start_at.strftime('%H:%M:%S')} "
+                     f"(offset {offset:+.0f} ms, ready {lead:.0f}s early).")
+
+    # ---- Checkpoint
+    def _checkpoint(self) -> None:
+        save_checkpoint(self.name, {
+            "t0": datetime.fromtimestamp(self.t0[1]).isoformat(),  # for people reading run_state.json
+            "t0_ts": self.t0[1],
+            "next_step": self._next_step,
+            "status": self.current_status.value if self.current_status else None,
+            "intervals": intervals_to_dict(self.intervals),
+            "saved": datetime.now().isoformat(timespec="seconds"),
+        })
+
+    def restore(self, cp: dict) -> None:
+        """Continue a checkpointed shift: no new Available click, timeline from the saved point."""
+        t0_ts = float(cp["t0_ts"])
+        self.t0 = (time.monotonic() - (time.time() - t0_ts), t0_ts)
+        self._next_step = int(cp.get("next_step", 0))
+        self.current_status = Status(cp["status"]) if cp.get("status") else None
+        self._start_done = True
+
+    def _catch_up(self, timeline: List[Step]) -> set:
+        """Steps missed while down: only the latest status change (and the end) still matter."""
+        now = time.monotonic()
+        due = [i for i in range(self._next_step, len(timeline)) if timeline[i].at_mono <= now]
+        keep = {i for i in due if timeline[i].kind == "end"}
+        changes = [i for i in due if timeline[i].kind in ("status", "ready")]
+        if changes:
+            keep.add(changes[-1])
+        skip = set(due) - keep
+        for i in sorted(skip):
+            log.info("[%s] Resume: skipping missed %s at %s", self.name, timeline[i].kind,
+                     timeline[i].at_wall.strftime("%H:%M:%S"))
+        return skip
 
     # ---- Main sequence
+    def _log_skew(self, step: Step, actual_ms: float) -> None:
+        skew = actual_ms - step.at_ts * 1000.0
+        what = f"{step.kind} {step.status.value}" if step.status else step.kind
+        log.info("[%s] %s: scheduled %s, skew %+.0f ms", self.name, what, step.at_wall.strftime("%H:%M:%S"), skew)
+
     def _run_once(self) -> bool:
         try:
-            self.driver = self._make_driver()
-            self.driver.get(GENESYS_URL)
-            self.driver.maximize_window()
-            time.sleep(2.0)
-            tg_send_text("Script started.")
-
-            self._ensure_menu_open_retry()
-            self._select_status(Status.AVAILABLE)
-            tg_send_text("Login successfully. Status set to Available.")
-
-            if self.intervals.start_on_shift > 0:
-                time.sleep(self.intervals.start_on_shift)
-            tg_send_text("Shift has been started.")
-            time.sleep(3)
-            os_screenshot_and_send("Available (start)")
-
-            total_waited = 0
-            for status, wait_before, duration in sequence_plan(self.intervals):
-                if wait_before > 0:
-                    time.sleep(wait_before)
-                    total_waited += wait_before
-
-                if status is not Status.AVAILABLE:
-                    self._select_status(status)
-                    tg_send_text(f"Status set to {status.value}.")
-                    time.sleep(3)
-                    os_screenshot_and_send(status.value)
-
-                if duration > 0:
-                    time.sleep(duration)
-                    total_waited += duration
-                    self._select_status(Status.AVAILABLE)
-                    tg_send_text("Status set to Ready.")
-                    time.sleep(3)
-                    os_screenshot_and_send("Ready")
-
-            remain = max(self.intervals.close_after - total_waited, 0)
-            if remain:
-                time.sleep(remain)
-
-            tg_send_text("Shift is over.")
+            self.started_at = datetime.now()
+            self._open_session()
+            resumed = self.t0 is not None
+            if resumed:
+                self._say(f"Script resumed (shift from {datetime.fromtimestamp(self.t0[1]).strftime('%H:%M:%S')}, "
+                          f"step {self._next_step}).")
+            else:
+                self._say("Script started.")
+                self._start_available()
+
+            timeline = compile_timeline(self.intervals, *self.t0)
+            log.info("[%s] Timeline: %s", self.name, ", ".join(
+                f"{st.at_wall.strftime('%H:%M:%S')} {st.status.value if st.status else 'end'}" for st in timeline))
+            skip = self._catch_up(timeline) if resumed else set()
+            for i in range(self._next_step, len(timeline)):
+                st = timeline[i]
+                if i in skip:
+                    self._next_step = i + 1
+                    continue
+                if self._sleep_to(st, timeline):
+                    skip = self._catch_up(timeline)
+                    if i in skip:
+                        self._next_step = i + 1
+                        continue
+                if st.kind == "shift_start":
+                    self._log_skew(st, now_ms())
+                    self._notify("shift_start", "Shift has been started.", "Available (start)")
+                elif st.kind == "end":
+                    self._log_skew(st, now_ms())
+                else:
+                    self._set_status(st.status)  # not confirmed: no checkpoint, the retry replays this step
+                    self._log_skew(st, self.last_click_ms or now_ms())
+                    if st.kind == "ready":
+                        self._notify("status", "Status set to Ready.", "Ready")
+                    else:
+                        self._notify("status", f"Status set to {st.status.value}.", st.status.value)
+                self._next_step = i + 1
+                self._checkpoint()
+
+            self._say("Shift is over.")
             return True
 
         except Exception as e:
             if not self.manual_stop:
-                tg_send_text(f"Error: {e}")
                 try:
-                    os_screenshot_and_send("Error screen")
+                    self._notify("error", f"Error: {e}", "Error screen")
                 except Exception:
                     pass
+                # relaunch on retry only if the session actually died
+                if self.driver is not None and not DriverManager.healthy(self.driver):
+                    self.driver = None
+                    self.drivers.discard()
             return False
 
     def run(self):
+        self._runner = threading.current_thread()
         tries = 0
-        try_complete = False
-        while tries <= RESTART_MAX_TRIES:
-            if self.manual_stop:
-                break
-            if tries > 0:
-                tg_send_text(f"Retry {tries}/{RESTART_MAX_TRIES} in {RESTART_BACKOFF}s…")
-                for _ in range(RESTART_BACKOFF):
-                    if self.manual_stop:
-                        break
-                    time.sleep(1)
+        try_complete = gave_up = False
+        try:
+            while tries <= RESTART_MAX_TRIES:
                 if self.manual_stop:
                     break
-            tries += 1
-            try_complete = self._run_once()
-            if try_complete:
-                break
+                if tries > 0:
+                    self._say(f"Retry {tries}/{RESTART_MAX_TRIES} in {RESTART_BACKOFF}s…")
+                    if self._stop.wait(RESTART_BACKOFF):
+                        break
+                tries += 1
+                try_complete = self._run_once()
+                if try_complete:
+                    break
+            else:
+                gave_up = True
+                self._say(f"Giving up after {tries} tries; the run will not be resumed on restart.")
+        finally:
+            # only a process that died mid-run keeps the checkpoint for the next start
+            if try_complete or gave_up or self.manual_stop:
+                save_checkpoint(self.name, None)
+            self.close()
 
-        if try_complete and self.driver:
-            try:
-                self.driver.quit()
-            except Exception:
-                pass
-            self.driver = None
+# =========================
+# Snapshot for TG "Test"
+# =========================
+CURRENT_SNAPSHOT: Optional[Intervals] = None
+
+def set_snapshot(snap: Intervals) -> None:
+    global CURRENT_SNAPSHOT
+    CURRENT_SNAPSHOT = snap
+
+def get_snapshot() -> Optional[Intervals]:
+    return CURRENT_SNAPSHOT
 
 # =========================
-# Controller (single run)
+# Orchestrator (one StatusBot per agent)
 # =========================
-_controller_lock = threading.Lock()
-_controller: Optional[StatusBot] = None
-_worker_thread: Optional[threading.Thread] = None
+@dataclass
+class AgentSpec:
+    name: str
+    profile_dir: str = CHROME_PROFILE_DIR
+    chat_ids: Optional[List[int]] = None  # None -> DEST_CHAT_IDS
+    intervals: Optional[Intervals] = None  # None -> latest GUI snapshot
+
+    @classmethod
+    def from_config(cls, d: dict) -> "AgentSpec":
+        iv = d.get("intervals")
+        return cls(
+            name=str(d["name"]),
+            profile_dir=str(d.get("profile_dir") or CHROME_PROFILE_DIR),
+            chat_ids=[int(x) for x in d.get("dest_chat_ids") or []] or None,
+            intervals=intervals_from_dict(iv) if iv else None,
+        )
 
-def _reset_state() -> None:
-    global _controller, _worker_thread
-    with _controller_lock:
-        try:
-            if _controller and _controller.driver:
-                _controller.close()
-        except Exception:
-            pass
-        _controller = None
-        _worker_thread = None
+STOP_JOIN_TIMEOUT = 2.0  # seconds; waits are interruptible, only a blocked WebDriver call can take longer
 
-def is_running() -> bool:
-    global _worker_thread, _controller
-    if _worker_thread is not None and _worker_thread.is_alive():
+class Orchestrator:
+    """Runs agents side by side, each in its own thread with its own Chrome profile and chats."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._specs: Dict[str, AgentSpec] = {}
+        self._bots: Dict[str, StatusBot] = {}
+        self._threads: Dict[str, threading.Thread] = {}
+
+    def add(self, spec: AgentSpec) -> None:
+        with self._lock:
+            if any(s.profile_dir == spec.profile_dir and s.name != spec.name for s in self._specs.values()):
+                log.warning("Agent %s shares profile %s with another agent", spec.name, spec.profile_dir)
+            self._specs[spec.name] = spec
+
+    def get(self, name: str) -> Optional[AgentSpec]:
+        return self._specs.get(name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._specs)
+
+    def controller(self, name: str = DEFAULT_AGENT) -> Optional[StatusBot]:
+        return self._bots.get(name)
+
+    def is_running(self, name: str = DEFAULT_AGENT) -> bool:
+        with self._lock:
+            th = self._threads.get(name)
+            if th is not None and th.is_alive():
+                return True
+            self._threads.pop(name, None)
+
+            ctrl = self._bots.get(name)
+            if ctrl and ctrl.driver is not None:
+                if ctrl.session_alive():
+                    return True
+                try:
+                    ctrl.close()
+                except Exception:
+                    pass
+                self._bots.pop(name, None)
+            return False
+
+    def start(self, name: str = DEFAULT_AGENT, intervals: Optional[Intervals] = None,
+              start_at: Optional[datetime] = None, resume: Optional[dict] = None) -> bool:
+        """resume - checkpoint from run_state.json: continue that shift instead of starting a new one."""
+        spec = self.get(name)
+        if spec is None:
+            tg_send_text(f"Unknown agent: {name}")
+            return False
+        intervals = intervals or spec.intervals or get_snapshot()
+        if intervals is None:
+            tg_send_text(f"[{name}] No intervals: open the GUI or set them in app_config.json.")
+            return False
+        with self._lock:
+            if self.is_running(name):
+                tg_send_text("Already running." if name == DEFAULT_AGENT else f"[{name}] Already running.",
+                             spec.chat_ids)
+                return False
+            bot = StatusBot(intervals, profile_dir=spec.profile_dir, start_at=start_at,
+                            name=name, chat_ids=spec.chat_ids)
+            if resume is not None:
+                bot.restore(resume)
+            else:
+                save_checkpoint(name, None)  # a new shift replaces whatever was left over
+            th = threading.Thread(target=bot.run, daemon=True, name=f"status_sequence_{name}")
+            self._bots[name] = bot
+            self._threads[name] = th
+        th.start()
         return True
-    _worker_thread = None
 
-    ctrl = _controller
-    if ctrl and ctrl.driver is not None:
-        if ctrl.session_alive():
-            return True
+    def stop(self, name: str = DEFAULT_AGENT) -> None:
+        with self._lock:
+            ctrl = self._bots.pop(name, None)
+            th = self._threads.pop(name, None)
+        if ctrl is None:
+            return
+        t = time.perf_counter()
         try:
-            ctrl.close()
+            ctrl.request_stop()
         except Exception:
             pass
-        _controller = None
-    return False
+        if th is not None and th is not threading.current_thread():
+            th.join(STOP_JOIN_TIMEOUT)
+            if th.is_alive():
+                log.warning("[%s] Runner still inside a WebDriver call after %.1fs, left to finish",
+                            name, STOP_JOIN_TIMEOUT)
+            else:
+                log.info("[%s] Runner stopped in %.0f ms", name, (time.perf_counter() - t) * 1000.0)
 
-def start_sequence_with(intervals: Intervals) -> None:
-    """Start sequence in background with given snapshot."""
-    global _controller, _worker_thread
-    if is_running():
-        tg_send_text("Already running.")
-        return
+    def reschedule(self, name: str, start_at: datetime, intervals: Optional[Intervals] = None) -> bool:
+        """Move the pending Available click of a pre-launched run (Chrome stays as it is)."""
+        ctrl = self.controller(name)
+        return bool(ctrl and self.is_running(name) and ctrl.reschedule(start_at, intervals))
 
-    with _controller_lock:
-        _controller = StatusBot(intervals)
-        _controller.manual_stop = False
+    def stop_all(self) -> None:
+        for name in self.names():
+            self.stop(name)
 
-    def _run():
+    def force(self, name: str, status: Status) -> bool:
+        ctrl = self.controller(name)
+        if ctrl is None or not self.is_running(name):
+            return False
+        threading.Thread(target=lambda: ctrl.force_status(status), daemon=True,
+                         name=f"force_{name}_{status.value}").start()
+        return True
+
+    def status(self, name: str) -> str:
+        if name not in self._specs:
+            return f"{name}: unknown agent"
+        ctrl = self.controller(name)
+        if ctrl is None or not self.is_running(name):
+            return f"{name}: idle"
+        cur = ctrl.current_status.value if ctrl.current_status else "starting"
+        since = ctrl.started_at.strftime("%H:%M:%S") if ctrl.started_at else "?"
+        if ctrl.start_at and ctrl.start_at > datetime.now():
+            return f"{name}: pre-launched, Available at {ctrl.start_at.strftime('%H:%M:%S')}"
+        return f"{name}: running since {since}, status {cur}"
+
+    def presence(self, name: str = DEFAULT_AGENT) -> str:
+        """Presence text from the page; also works with no run active if the warm Chrome is alive."""
+        spec = self.get(name)
+        if spec is None:
+            return f"Unknown agent: {name}"
+        ctrl = self.controller(name)
         try:
-            _controller.run()
-        finally:
-            pass
+            if ctrl is not None and ctrl.driver is not None and self.is_running(name):
+                r = ctrl.read_presence()
+            else:
+                driver = driver_manager_for(spec.profile_dir).peek()
+                if driver is None or not DriverManager.healthy(driver):
+                    return "Браузер не запущен: статус прочитать нельзя."
+                r = read_presence(driver)
+        except FutureTimeout:
+            # the runner is mid-click / login / pre-launch and picks the read up only between steps
+            cur = ctrl.current_status if ctrl is not None else None
+            last = f"last set by the bot: {cur.value}" if cur else "nothing set by the bot yet"
+            return f"Presence: busy, page not read ({last}). Try again in a few seconds."
+        except Exception as e:
+            return f"Presence read failed: {e or type(e).__name__}"
+        log.info("[%s] Presence read in %.0f ms: %s", name, r.elapsed_ms, r.label)
+        return r.text()
 
-    _worker_thread = threading.Thread(target=_run, daemon=True, name="status_sequence")
-    _worker_thread.start()
+    def status_all(self) -> List[str]:
+        return [self.status(n) for n in self.names()]
+
+orchestrator = Orchestrator()
+orchestrator.add(AgentSpec(DEFAULT_AGENT))
+for _a in CONFIG.agents:
+    try:
+        orchestrator.add(AgentSpec.from_config(_a))
+    except Exception as e:
+        log.error("Bad agent entry %r in app_config.json: %s", _a, e)
+
+def resume_saved_runs() -> List[str]:
+    """Process start: continue shifts that were still going when the previous process died."""
+    if not CONFIG.resume_on_restart:
+        return []
+    resumed = []
+    for name, cp in load_checkpoints().items():
+        try:
+            iv = intervals_from_dict(cp["intervals"])
+            end = compile_timeline(iv, 0.0, float(cp["t0_ts"]))[-1]
+        except Exception as e:
+            log.error("Bad checkpoint for %s, dropped: %s", name, e)
+            save_checkpoint(name, None)
+            continue
+        if end.at_ts <= time.time() or orchestrator.get(name) is None:
+            save_checkpoint(name, None)
+            continue
+        log.info("[%s] Resuming shift started %s (ends %s)", name, cp["t0"], end.at_wall.strftime("%H:%M:%S"))
+        if orchestrator.start(name, iv, resume=cp):
+            resumed.append(name)
+    return resumed
 
 # =========================
-# Snapshot for TG "Test"
+# Default agent (GUI / plain Telegram buttons)
 # =========================
-CURRENT_SNAPSHOT: Optional[Intervals] = None
-
-def set_snapshot(snap: Intervals) -> None:
-    global CURRENT_SNAPSHOT
-    CURRENT_SNAPSHOT = snap
+def is_running() -> bool:
+    return orchestrator.is_running(DEFAULT_AGENT)
 
-def get_snapshot() -> Optional[Intervals]:
-    return CURRENT_SNAPSHOT
+def start_sequence_with(intervals: Intervals, start_at: Optional[datetime] = None) -> None:
+    """Start sequence in background with given snapshot; start_at = pre-launched run clicking Available then."""
+    orchestrator.start(DEFAULT_AGENT, intervals, start_at=start_at)
 
-# =========================
-# TG helpers for current controller
-# =========================
 def _get_controller() -> Optional[StatusBot]:
-    global _controller
-    return _controller
+    return orchestrator.controller(DEFAULT_AGENT)
 
 def force_status_cmd(status: Status) -> None:
     """Force status using the **running** controller."""
-    ctrl = _get_controller()
-    if not is_running() or ctrl is None:
+    if not orchestrator.force(DEFAULT_AGENT, status):
         tg_send_text("Не запущено: сначала Start/Test.")
-        return
-    threading.Thread(target=lambda: ctrl.force_status(status), daemon=True, name=f"force_{status.value}").start()
 
 def request_stop_and_reset() -> None:
     """Stop current run (if any) and fully reset state."""
-    try:
-        ctrl = _get_controller()
-        if ctrl:
-            ctrl.request_stop()
-    except Exception:
-        pass
-    _reset_state()
-    time.sleep(1.0)
-    os_screenshot_and_send("Stopped (desktop view)")
+    orchestrator.stop(DEFAULT_AGENT)
+    # the settle pause is for the screenshot only; the caller (TG handler) must not wait for it
+    threading.Thread(target=notify_event, args=("stop", "Stopped.", "Stopped (desktop view)"),
+                     kwargs={"settle": 1.0}, daemon=True, name="stop_notify").start()
+
+_startup_mark("logic")
 
 
 # ===== scheduler.py =====
 # -*- coding: utf-8 -*-
+import heapq
 import threading
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 def compute_target_from_hhmm(h: int, m: int) -> tuple[datetime, int]:
     now = datetime.now()
@@ -722,46 +2952,222 @@ def fmt_td(td: timedelta) -> str:
     secs = int(td.total_seconds())
     return f"{secs//3600}h {secs%3600//60}m {secs%60}s"
 
-class OneShotScheduler:
-    def __init__(self):
-        # Важно: RLock вместо Lock, чтобы не ловить дедлок при schedule_dt -> cancel
-        self._timer: Optional[threading.Timer] = None
-        self._target: Optional[datetime] = None
-        self._lock = threading.RLock()
+def _next_occurrence(when: datetime, now: datetime) -> datetime:
+    target = when
+    if target.date() == now.date() and target.hour == now.hour and target.minute == now.minute:
+        if (60 - now.second) < 10:
+            target = target + timedelta(days=1)
+    elif target <= now:
+        target = target + timedelta(days=1)
+    return target
+
+SCHEDULE_PATH = os.path.join(os.path.dirname(CONFIG.path), "schedule.json")
+SCHED_RECHECK_SEC = 30.0        # longest sleep before the wall clock is looked at again (clock change / suspend)
+SCHED_MISSED_GRACE_SEC = 600.0  # a start found later than this (machine was asleep) is skipped, not run
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+def _next_weekly(weekday: int, h: int, m: int, after: datetime) -> datetime:
+    target = after.replace(hour=h, minute=m, second=0, microsecond=0)
+    target += timedelta(days=(weekday - target.weekday()) % 7)
+    if target <= after:
+        target += timedelta(days=7)
+    return target
+
+@dataclass
+class Job:
+    id: int
+    target: datetime                       # instant of the Available click
+    agent: str = DEFAULT_AGENT
+    intervals: Optional[Intervals] = None  # None -> agent's own intervals / GUI snapshot at fire time
+    lead: float = 0.0                      # pre-launch: fire this many seconds before target
+    weekly: Optional[Tuple[int, int, int]] = None  # (weekday, h, m): re-armed for next week after firing
+
+    @property
+    def fire_at(self) -> datetime:
+        return self.target - timedelta(seconds=self.lead)
+
+    def to_json(self) -> dict:
+        return {"target": self.target.isoformat(), "agent": self.agent, "lead": self.lead,
+                "intervals": intervals_to_dict(self.intervals) if self.intervals else None}
+
+class Scheduler:
+    """All pending starts in one heap, served by one thread.
+    Waits are monotonic (Condition.wait) and capped at SCHED_RECHECK_SEC, and every wake-up
+    re-reads the wall clock, so clock changes and suspend/resume cannot shift or lose a start.
+    One-shot starts survive restarts via schedule.json; weekly ones come from weekly_schedule."""
+
+    def __init__(self, path: str = SCHEDULE_PATH):
+        self.path = path
+        self._cv = threading.Condition(threading.RLock())
+        self._heap: List[Tuple[datetime, int]] = []
+        self._jobs: Dict[int, Job] = {}
+        self._ids = 0
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- jobs
+    def _add(self, job_kw: dict) -> Job:
+        with self._cv:
+            self._ids += 1
+            job = Job(self._ids, **job_kw)
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (job.fire_at, job.id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="scheduler")
+                self._thread.start()
+            self._cv.notify()
+        return job
+
+    def _drop(self, pred) -> int:
+        with self._cv:
+            ids = [j.id for j in self._jobs.values() if pred(j)]
+            for i in ids:
+                del self._jobs[i]  # heap entry is skipped when it comes up
+            self._cv.notify()
+            return len(ids)
+
+    def jobs(self) -> List[Job]:
+        with self._cv:
+            return sorted(self._jobs.values(), key=lambda j: j.fire_at)
+
+    def schedule_start(self, when: datetime, intervals: Optional[Intervals],
+                       lead: Optional[float] = None, agent: str = DEFAULT_AGENT,
+                       replace: bool = True) -> Tuple[int, datetime]:
+        """Start `agent` at `when`, pre-launching `lead` seconds early so Chrome is ready by then.
+        replace=True drops the agent's other one-shot starts (GUI/timepad "Start" semantics)."""
+        lead = CONFIG.prelaunch_lead_sec if lead is None else lead
+        now = datetime.now()
+        target = _next_occurrence(when, now)
+        delay = int((target - now).total_seconds())
+        with self._cv:
+            if replace:
+                self._drop(lambda j: j.agent == agent and j.weekly is None)
+                if orchestrator.reschedule(agent, target, intervals):
+                    # already pre-launched and waiting: just move its click
+                    log.info("[%s] Pre-launched run rescheduled to %s", agent, target.strftime("%H:%M:%S"))
+                    self._save()
+                    return delay, target
+            job = self._add(dict(target=target, agent=agent, intervals=intervals, lead=lead))
+            self._save()
+        log.info("[%s] Start at %s, pre-launch in %.0fs", agent, target.strftime("%H:%M:%S"),
+                 max((job.fire_at - now).total_seconds(), 0.0))
+        return delay, target
+
+    def add_weekly(self, weekday: int, h: int, m: int, agent: str = DEFAULT_AGENT,
+                   intervals: Optional[Intervals] = None, lead: Optional[float] = None) -> Job:
+        lead = CONFIG.prelaunch_lead_sec if lead is None else lead
+        return self._add(dict(target=_next_weekly(weekday, h, m, datetime.now() + timedelta(seconds=lead)),
+                              agent=agent, intervals=intervals, lead=lead, weekly=(weekday, h, m)))
+
+    def cancel(self, agent: Optional[str] = None) -> None:
+        """Drop pending one-shot starts (all agents, or one); weekly templates stay."""
+        n = self._drop(lambda j: j.weekly is None and (agent is None or j.agent == agent))
+        if n:
+            self._save()
+
+    def eta(self, agent: str = DEFAULT_AGENT) -> Optional[timedelta]:
+        now = datetime.now()
+        cands = [j.target for j in self.jobs() if j.agent == agent]
+        ctrl = orchestrator.controller(agent)
+        if ctrl is not None and ctrl.start_at and ctrl.start_at > now and orchestrator.is_running(agent):
+            cands.append(ctrl.start_at)  # pre-launched, waiting for its click
+        if not cands:
+            return None
+        return max(min(cands) - now, timedelta(0))
+
+    # ---- dispatcher thread
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while True:
+                    while self._heap and self._heap[0][1] not in self._jobs:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cv.wait(SCHED_RECHECK_SEC)
+                        continue
+                    fire_at, jid = self._heap[0]
+                    job = self._jobs[jid]
+                    if job.fire_at != fire_at:  # stale entry
+                        heapq.heappop(self._heap)
+                        continue
+                    left = (fire_at - datetime.now()).total_seconds()
+                    if left <= 0:
+                        break
+                    self._cv.wait(min(left, SCHED_RECHECK_SEC))
+                heapq.heappop(self._heap)
+                del self._jobs[jid]
+                if job.weekly is not None:
+                    wd, h, m = job.weekly
+                    self._add(dict(target=_next_weekly(wd, h, m, job.target), agent=job.agent,
+                                   intervals=job.intervals, lead=job.lead, weekly=job.weekly))
+                else:
+                    self._save()
+            try:
+                self._fire(job)
+            except Exception as e:
+                log.error("Scheduled job %s failed: %s", job.id, e)
+
+    def _fire(self, job: Job) -> None:
+        late = (datetime.now() - job.target).total_seconds()
+        if late > SCHED_MISSED_GRACE_SEC:
+            log.warning("[%s] Start %s missed by %.0fs, skipped", job.agent, job.target, late)
+            tg_send_text(f"[{job.agent}] Пропущен старт {job.target.strftime('%d.%m %H:%M')} "
+                         f"(опоздание {fmt_td(timedelta(seconds=late))}).")
+            return
+        log.info("[%s] Firing start for %s", job.agent, job.target.strftime("%H:%M:%S"))
+        orchestrator.start(job.agent, job.intervals, start_at=job.target)
 
-    def schedule_dt(self, when: datetime, fn, *args, **kwargs) -> Tuple[int, datetime]:
-        with self._lock:
-            self.cancel()
-            now = datetime.now()
-            target = when
-            if target.date() == now.date() and target.hour == now.hour and target.minute == now.minute:
-                if (60 - now.second) < 10:
-                    target = target + timedelta(days=1)
-            elif target <= now:
-                target = target + timedelta(days=1)
-            delay = int((target - now).total_seconds())
-            self._target = target
-            self._timer = threading.Timer(delay, fn, args=args, kwargs=kwargs)
-            self._timer.daemon = True
-            self._timer.start()
-            return delay, target
-
-    def cancel(self):
-        with self._lock:
-            if self._timer:
-                try:
-                    self._timer.cancel()
-                finally:
-                    self._timer = None
-            self._target = None
+    # ---- persistence
+    def _save(self) -> None:
+        data = [j.to_json() for j in self.jobs() if j.weekly is None]
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            log.error("Schedule save failed (%s): %s", self.path, e)
 
-    def eta(self) -> Optional[timedelta]:
-        with self._lock:
-            if not self._target:
-                return None
-            return max(self._target - datetime.now(), timedelta(0))
+    def load(self) -> int:
+        """Process start: pending one-shot starts from schedule.json + weekly templates from config."""
+        n = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            saved = []
+        except Exception as e:
+            log.error("Schedule read failed (%s): %s", self.path, e)
+            saved = []
+        now = datetime.now()
+        for d in saved:
+            try:
+                target = datetime.fromisoformat(d["target"])
+                if (now - target).total_seconds() > SCHED_MISSED_GRACE_SEC:
+                    continue
+                iv = intervals_from_dict(d["intervals"]) if d.get("intervals") else None
+                self._add(dict(target=target, agent=d.get("agent", DEFAULT_AGENT), intervals=iv,
+                               lead=float(d.get("lead", 0))))
+                n += 1
+            except Exception as e:
+                log.error("Bad schedule entry %r: %s", d, e)
+        for w in CONFIG.weekly_schedule:
+            try:
+                h, m = (int(x) for x in str(w["time"]).split(":"))
+                iv = intervals_from_dict(w["intervals"]) if w.get("intervals") else None
+                for day in w.get("days", WEEKDAYS[:5]):
+                    wd = day if isinstance(day, int) else WEEKDAYS.index(str(day).lower()[:3])
+                    self.add_weekly(wd, h, m, agent=w.get("agent", DEFAULT_AGENT), intervals=iv)
+                    n += 1
+            except Exception as e:
+                log.error("Bad weekly_schedule entry %r: %s", w, e)
+        self._save()
+        if n:
+            log.info("Scheduler: %d job(s), next %s", n,
+                     ", ".join(f"{j.agent}@{j.target.strftime('%a %H:%M')}" for j in self.jobs()[:3]))
+        return n
 
-scheduler = OneShotScheduler()
+scheduler = Scheduler()
+_startup_mark("scheduler")
 
 
 # ===== tg_bot.py =====
@@ -770,25 +3176,28 @@ scheduler = OneShotScheduler()
 Telegram bot (reply keyboard + inline timepad for Start).
 - Start in TG: enabled with 4-digit HHMM keypad (inline)
 - Test: uses latest snapshot from GUI
-- Stop: cancels schedule and stops current run
+- Stop: cancels schedule and stops current run (warm Chrome and the Genesys presence are left as they are)
 - Break/Lunch/Ready: act on current running controller
+- /agents, /agent <name> test|stop|status|break|lunch|ready: other agents from app_config.json
+- /stats: latency per operation (menu, status click, screenshots, Telegram, Chrome)
 """
 import asyncio
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict
 
-from telegram import (
-    Update, ReplyKeyboardMarkup, KeyboardButton,
-    InlineKeyboardMarkup, InlineKeyboardButton
-)
-from telegram.ext import (
-    Application, MessageHandler, CommandHandler,
-    CallbackQueryHandler, filters, ContextTypes
-)
+from typing import TYPE_CHECKING
 
-# Import after CONFIG is ready
-import logic
-from scheduler import scheduler, compute_target_from_hhmm, fmt_td
+# python-telegram-bot is imported when the bot thread starts (run_in_thread)
+telegram = _LazyModule("telegram")
+telegram_ext = _LazyModule("telegram.ext")
+
+if TYPE_CHECKING:
+    from telegram import InlineKeyboardMarkup, Update
+    from telegram.ext import ContextTypes
+
+# Combined build: logic/scheduler sections live in this module
+logic = sys.modules[__name__]
 
 log = logging.getLogger("tg")
 
@@ -797,18 +3206,91 @@ BOT_TOKEN = CONFIG.bot_token
 ALLOWED_USERS = set(CONFIG.allowed_users)
 
 # ===== Reply keyboard (as before) =====
-TG_KB = ReplyKeyboardMarkup(
-    [
-        [KeyboardButton("Start"), KeyboardButton("Test"), KeyboardButton("🛑 Stop")],
-        [KeyboardButton("Check status")],
-        [KeyboardButton("Break"), KeyboardButton("Lunch"), KeyboardButton("Ready")],
-    ],
-    resize_keyboard=True,
-)
+TG_KB = None  # built in run_in_thread, when telegram is actually loaded
+
+def _build_reply_kb():
+    KeyboardButton = telegram.KeyboardButton
+    return telegram.ReplyKeyboardMarkup(
+        [
+            [KeyboardButton("Start"), KeyboardButton("Test"), KeyboardButton("🛑 Stop")],
+            [KeyboardButton("Check status")],
+            [KeyboardButton("Break"), KeyboardButton("Lunch"), KeyboardButton("Ready")],
+        ],
+        resize_keyboard=True,
+    )
+
+# ===== Blocking logic off the event loop =====
+# Selenium round trips, thread joins, screenshots and file writes never run on the bot loop.
+# Commands that change state share one worker and are queued on it before the handler's first
+# await, so they apply in the order they arrived even with concurrent_updates; the acknowledgement
+# and the outcome (if worth telling) are sent afterwards by a background task.
+# Read-only queries use the loop's default executor and never wait behind a slow command.
+_cmd_pool: ThreadPoolExecutor | None = None
+_cmd_tasks: set = set()  # keeps fire-and-forget tasks referenced until done
+
+def _cmd_submit(fn, *args, **kwargs) -> Future:
+    global _cmd_pool
+    if _cmd_pool is None:
+        _cmd_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tg_cmd")
+    return _cmd_pool.submit(fn, *args, **kwargs)
+
+def _cmd_bg(update: Update, fn, *args, ack: str | None = None, done=None) -> None:
+    """Queue fn on the command worker now, without waiting; then reply `ack` and, once fn
+    returns, done(result) -> follow-up text or None."""
+    fut = asyncio.wrap_future(_cmd_submit(fn, *args))
+
+    async def _run():
+        if ack:
+            try:
+                await update.effective_message.reply_text(ack, reply_markup=TG_KB)
+            except Exception as e:
+                log.warning("TG reply failed: %s", e)
+        try:
+            res = await fut
+        except Exception as e:
+            log.error("TG command %s failed: %s", getattr(fn, "__name__", fn), e)
+            text = f"Ошибка: {e}"
+        else:
+            text = done(res) if done else None
+        if text:
+            try:
+                await update.effective_message.reply_text(text, reply_markup=TG_KB)
+            except Exception as e:
+                log.warning("TG follow-up failed: %s", e)
+    task = asyncio.get_running_loop().create_task(_run())
+    _cmd_tasks.add(task)
+    task.add_done_callback(_cmd_tasks.discard)
+
+async def _query(fn, *args, **kwargs):
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+def _stop_agent(name: str) -> None:
+    scheduler.cancel(name)
+    if name == logic.DEFAULT_AGENT:
+        logic.request_stop_and_reset()
+    else:
+        logic.orchestrator.stop(name)
+
+def _test_start(snap) -> bool:
+    # checked on the command worker, after any Stop queued before it
+    if logic.is_running():
+        return False
+    logic.start_sequence_with(snap)
+    return True
+
+def _schedule_start(target, snap, msg: str) -> None:
+    scheduler.schedule_start(target, snap)
+    logic.tg_send_text(msg)
 
 # ===== Inline Timepad state =====
 # per-user session: { user_id: {"buf": "HHMM_partial", "chat_id": int, "msg_id": int} }
 timepad_sessions: Dict[int, Dict[str, int | str]] = {}
+# Updates run concurrently (concurrent_updates): a user's keypad taps must not interleave,
+# each one reads-modifies-writes the session buffer around awaits.
+_timepad_locks: Dict[int, asyncio.Lock] = {}
+
+def _timepad_lock(uid: int) -> asyncio.Lock:
+    return _timepad_locks.setdefault(uid, asyncio.Lock())
 
 async def _gate(update: Update) -> bool:
     if ALLOWED_USERS and (not update.effective_user or update.effective_user.id not in ALLOWED_USERS):
@@ -829,7 +3311,8 @@ def _valid_time(buf: str) -> tuple[bool, int, int]:
     hh = int(buf[:2]); mm = int(buf[2:])
     return (0 <= hh <= 23 and 0 <= mm <= 59), hh, mm
 
-def _timepad_markup(buf: str) -> InlineKeyboardMarkup:
+def _timepad_markup(buf: str) -> "InlineKeyboardMarkup":
+    InlineKeyboardButton = telegram.InlineKeyboardButton
     ok, hh, mm = _valid_time(buf)
     ok_label = f"✅ OK {hh:02d}:{mm:02d}" if ok else "✅ OK"
     rows = [
@@ -847,23 +3330,27 @@ def _timepad_markup(buf: str) -> InlineKeyboardMarkup:
          InlineKeyboardButton("✖ Cancel", callback_data="tp:cancel")],
         [InlineKeyboardButton(ok_label, callback_data="tp:ok")],
     ]
-    return InlineKeyboardMarkup(rows)
+    return telegram.InlineKeyboardMarkup(rows)
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await _gate(update): return
+    stop_help = ("🛑 Stop - остановить сценарий и отменить старт; Chrome остаётся открытым "
+                 "и залогиненным, статус в Genesys не меняется." if CONFIG.keep_driver_warm
+                 else "🛑 Stop - остановить сценарий, отменить старт и закрыть Chrome.")
     await update.message.reply_text(
         "Control ready. Кнопки ниже.\n"
         "Start - запланировать по времени (введите 4 цифры), "
-        "Test - старт сразу, 🛑 Stop - аварийно закрыть.",
+        f"Test - старт сразу, {stop_help}",
         reply_markup=TG_KB
     )
 
 async def _start_timepad_flow(update: Update):
     uid = update.effective_user.id
-    timepad_sessions[uid] = {"buf": "", "chat_id": update.effective_chat.id}
-    text = "Введите время запуска (HHMM). Примеры: 0908, 1745, 0000.\nТекущее: " + _fmt_buf("")
-    msg = await update.message.reply_text(text, reply_markup=_timepad_markup(""))
-    timepad_sessions[uid]["msg_id"] = msg.message_id
+    async with _timepad_lock(uid):
+        timepad_sessions[uid] = {"buf": "", "chat_id": update.effective_chat.id}
+        text = "Введите время запуска (HHMM). Примеры: 0908, 1745, 0000.\nТекущее: " + _fmt_buf("")
+        msg = await update.message.reply_text(text, reply_markup=_timepad_markup(""))
+        timepad_sessions[uid]["msg_id"] = msg.message_id
 
 async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await _gate(update): return
@@ -873,37 +3360,69 @@ async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await _start_timepad_flow(update)
 
     if txt == "test":
-        if logic.is_running():
-            return await update.message.reply_text("Уже запущено.", reply_markup=TG_KB)
         snap = logic.get_snapshot()
         if snap is None:
             return await update.message.reply_text("Снапшот ещё не готов. Откройте GUI.", reply_markup=TG_KB)
-        logic.start_sequence_with(snap)
-        return await update.message.reply_text("Стартую сейчас…", reply_markup=TG_KB)
+        return _cmd_bg(update, _test_start, snap, ack="Стартую сейчас…",
+                       done=lambda ok: None if ok else "Уже запущено.")
 
     if txt in ("🛑 stop", "stop"):
-        scheduler.cancel()
-        logic.request_stop_and_reset()
-        return await update.message.reply_text("🛑 Stopped. Готов к новому Start/Test.", reply_markup=TG_KB)
+        return _cmd_bg(update, _stop_agent, logic.DEFAULT_AGENT, ack="🛑 Останавливаю…",
+                       done=lambda _: "🛑 Stopped. Готов к новому Start/Test.")
 
     if txt == "check status":
-        logic.os_screenshot_and_send("Current desktop")
-        return await update.message.reply_text("Скрин отправлен.", reply_markup=TG_KB)
+        await update.message.reply_text(await _query(logic.orchestrator.presence, logic.DEFAULT_AGENT),
+                                        reply_markup=TG_KB)
+        if logic.notify_mode("check") != "text":
+            await _query(logic.os_screenshot_and_send, "Current desktop")
+        return
 
+    # force_status_cmd reports "not running" / errors itself
     if txt == "break":
-        logic.force_status_cmd(logic.Status.BREAK)
-        return await update.message.reply_text("Setting Break…", reply_markup=TG_KB)
+        return _cmd_bg(update, logic.force_status_cmd, logic.Status.BREAK, ack="Setting Break…")
 
     if txt == "lunch":
-        logic.force_status_cmd(logic.Status.MEAL)
-        return await update.message.reply_text("Setting Lunch…", reply_markup=TG_KB)
+        return _cmd_bg(update, logic.force_status_cmd, logic.Status.MEAL, ack="Setting Lunch…")
 
     if txt == "ready":
-        logic.force_status_cmd(logic.Status.AVAILABLE)
-        return await update.message.reply_text("Setting Ready…", reply_markup=TG_KB)
+        return _cmd_bg(update, logic.force_status_cmd, logic.Status.AVAILABLE, ack="Setting Ready…")
 
     return await update.message.reply_text("Не понял. Используй кнопки ниже.", reply_markup=TG_KB)
 
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await _gate(update): return
+    await update.message.reply_text("\n".join(logic.metrics.summary()), reply_markup=TG_KB)
+
+AGENT_FORCE = {"break": "BREAK", "lunch": "MEAL", "ready": "AVAILABLE"}
+
+async def cmd_agents(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await _gate(update): return
+    await update.message.reply_text("\n".join(await _query(logic.orchestrator.status_all)), reply_markup=TG_KB)
+
+async def cmd_agent(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await _gate(update): return
+    orch = logic.orchestrator
+    args = context.args or []
+    if len(args) != 2:
+        return await update.message.reply_text(
+            "Usage: /agent <name> test|stop|status|break|lunch|ready\nAgents: " + ", ".join(orch.names()),
+            reply_markup=TG_KB)
+    name, action = args[0], args[1].lower()
+    if orch.get(name) is None:
+        return await update.message.reply_text(f"Unknown agent: {name}", reply_markup=TG_KB)
+
+    if action == "test":
+        return _cmd_bg(update, orch.start, name, ack=f"[{name}] Стартую сейчас…", done=lambda ok: None if ok else f"[{name}] Не запущено.")
+    if action == "stop":
+        return _cmd_bg(update, _stop_agent, name, ack=f"[{name}] 🛑 Останавливаю…", done=lambda _: f"[{name}] 🛑 Stopped.")
+    if action == "status":
+        lines = [await _query(orch.status, name), await _query(orch.presence, name)]
+        return await update.message.reply_text("\n".join(lines), reply_markup=TG_KB)
+    if action in AGENT_FORCE:
+        return _cmd_bg(update, orch.force, name, logic.Status[AGENT_FORCE[action]],
+                       ack=f"[{name}] Setting {action.title()}…", done=lambda ok: None if ok else f"[{name}] Не запущено.")
+    return await update.message.reply_text(f"Unknown action: {action}", reply_markup=TG_KB)
+
 async def handle_timepad(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cq = update.callback_query
     if not cq:
@@ -912,6 +3431,10 @@ async def handle_timepad(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     uid = cq.from_user.id
+    async with _timepad_lock(uid):
+        await _timepad_key(update, cq, uid)
+
+async def _timepad_key(update: Update, cq, uid: int):
     sess = timepad_sessions.get(uid)
     if not sess:
         return await cq.answer("Сессия не активна", show_alert=False)
@@ -953,11 +3476,10 @@ async def handle_timepad(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             target, delay = compute_target_from_hhmm(hh, mm)
-            scheduler.schedule_dt(target, logic.start_sequence_with, snap)
 
             from datetime import timedelta as _td
             msg = f"Запланировано на {target.strftime('%H:%M')} (через {fmt_td(_td(seconds=delay))})."
-            logic.tg_send_text(msg)
+            _cmd_bg(update, _schedule_start, target, snap, msg)
 
             try:
                 await cq.edit_message_text(
@@ -981,39 +3503,114 @@ async def handle_timepad(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         pass
 
+# ===== Webhook mode (tg_mode = "webhook") =====
+WEBHOOK_MAX_BODY = 1 << 20  # Telegram updates are a few KB; anything bigger is not from Telegram
+
+def _webhook_handler(app, loop: asyncio.AbstractEventLoop, path: str, secret: str):
+    import hmac
+    from http.server import BaseHTTPRequestHandler
+
+    class _Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int) -> None:
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            if self.path.split("?", 1)[0] != path:
+                return self._reply(404)
+            got = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(got.encode(), secret.encode()):
+                log.warning("Webhook: bad secret token from %s", self.client_address[0])
+                return self._reply(403)
+            size = int(self.headers.get("Content-Length") or 0)
+            if size <= 0 or size > WEBHOOK_MAX_BODY:
+                return self._reply(413 if size else 400)
+            try:
+                update = telegram.Update.de_json(json.loads(self.rfile.read(size)), app.bot)
+            except Exception as e:
+                log.warning("Webhook: bad update (%s)", e)
+                return self._reply(400)
+            # handed to the bot loop; Telegram gets its 200 without waiting for the handler
+            asyncio.run_coroutine_threadsafe(app.update_queue.put(update), loop)
+            self._reply(200)
+
+        def log_message(self, fmt, *args):
+            log.debug("Webhook %s - " + fmt, self.client_address[0], *args)
+
+    return _Handler
+
+def _run_webhook(app, loop: asyncio.AbstractEventLoop) -> bool:
+    """Serve updates from the embedded listener; False (nothing started) when misconfigured."""
+    import secrets
+    from http.server import ThreadingHTTPServer
+    cfg = CONFIG.tg_webhook
+    path = "/" + str(cfg.get("path", "/tg")).lstrip("/")
+    url = str(cfg.get("url") or "").rstrip("/")
+    secret = str(cfg.get("secret") or "")
+    if not secret:
+        if not url:
+            # nobody (proxy / local test) could know a generated secret: every POST would get 403
+            log.error("tg_webhook: url and secret are both empty - set tg_webhook.secret "
+                      "(and send it as X-Telegram-Bot-Api-Secret-Token); falling back to polling")
+            return False
+        secret = secrets.token_urlsafe(32)  # only Telegram needs it, it gets it via setWebhook
+
+    async def _start():
+        await app.initialize()
+        await app.start()
+        if url:
+            await app.bot.set_webhook(url + path, secret_token=secret, allowed_updates=["message", "callback_query"])
+            log.info("TG webhook set to %s%s", url, path)
+    loop.run_until_complete(_start())
+
+    server = ThreadingHTTPServer((str(cfg.get("listen", "127.0.0.1")), int(cfg.get("port", 8443))),
+                                 _webhook_handler(app, loop, path, secret))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="tg_webhook").start()
+    log.info("TG webhook listener on %s:%d%s", *server.server_address[:2], path)
+    loop.run_forever()
+    return True
+
 def run_in_thread():
-    """Start Telegram bot in a daemon thread."""
+    """Start Telegram bot in a daemon thread (long polling, or webhook when tg_mode = "webhook")."""
     def _run():
+        global TG_KB
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        app = Application.builder().token(BOT_TOKEN).build()
-        app.add_handler(CommandHandler("start", cmd_start))
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_buttons))
-        app.add_handler(CallbackQueryHandler(handle_timepad, pattern=r"^tp:"))
+        ext = telegram_ext
+        TG_KB = _build_reply_kb()
+        # handlers only await executor work, so one slow update must not hold up the others
+        app = ext.Application.builder().token(BOT_TOKEN).concurrent_updates(True).build()
+        app.add_handler(ext.CommandHandler("start", cmd_start))
+        app.add_handler(ext.CommandHandler("agents", cmd_agents))
+        app.add_handler(ext.CommandHandler("agent", cmd_agent))
+        app.add_handler(ext.CommandHandler("stats", cmd_stats))
+        app.add_handler(ext.MessageHandler(ext.filters.TEXT & ~ext.filters.COMMAND, handle_buttons))
+        app.add_handler(ext.CallbackQueryHandler(handle_timepad, pattern=r"^tp:"))
 
         async def whoami():
             me = await app.bot.get_me()
             log.info("TG ready as @%s (id=%s)", me.username, me.id)
         loop.run_until_complete(whoami())
 
-        app.run_polling()
+        if CONFIG.tg_mode != "webhook" or not _run_webhook(app, loop):
+            app.run_polling()
 
     import threading
     threading.Thread(target=_run, daemon=True, name="tg_bot").start()
     log.info("Telegram bot thread started")
 
+_startup_mark("tg_bot")
+
 
 # ===== gui_app.py =====
 # -*- coding: utf-8 -*-
 import logging
 from datetime import datetime, timedelta
-import tkinter as tk
-from tkinter import ttk
 
-import logic
-from logic import Intervals
-from scheduler import scheduler, compute_target_from_hhmm, fmt_td
-import tg_bot  # запускаем бота в фоне
+# Combined build: logic/tg_bot sections live in this module
+logic = tg_bot = sys.modules[__name__]
 
 # DEBUG HOOKS
 
@@ -1068,7 +3665,7 @@ def start_program_at_scheduled_time():
         logic.set_snapshot(snap)
 
         target, delay = compute_target_from_hhmm(hh, mm)
-        scheduler.schedule_dt(target, logic.start_sequence_with, snap)
+        scheduler.schedule_start(target, snap)
         logic.tg_send_text(f"Запланировано на {target.strftime('%H:%M')} (через {fmt_td(timedelta(seconds=delay))}).")
     except Exception as e:
         logic.tg_send_text(f"Ошибка расписания: {e}")
@@ -1082,6 +3679,8 @@ def create_interface():
     global first_break_after_var, first_break_duration_var, lunch_after_var, lunch_duration_var
     global second_break_after_var, second_break_duration_var, close_after_var, start_on_shift_var
     global schedule_hour_var, schedule_minute_var, total_time_label
+    import tkinter as tk
+    from tkinter import ttk
 
     root = tk.Tk()
     root.title("Task Scheduler")
@@ -1149,7 +3748,20 @@ def create_interface():
     _update_snapshot_and_total()
     root.mainloop()
 
+_startup_mark("gui_app")
+
+def log_startup_report() -> None:
+    total = sum(STARTUP_TIMES.values())
+    log.info("Startup: %s", import_time_report())
+    if total > CONFIG.startup_budget_ms:
+        log.warning("Startup took %.0f ms, budget is %.0f ms", total, CONFIG.startup_budget_ms)
+
 if __name__ == "__main__":
+    log_startup_report()
     # Bot uses CONFIG.bot_token and CONFIG.allowed_users already
     tg_bot.run_in_thread()
+    logic.tg_dispatcher.start()  # replays the journal left by the previous run right away
+    logic.start_metrics_server()
+    logic.resume_saved_runs()
+    scheduler.load()
     create_interface()
@@ -0,0 +1,41 @@
+"""Shared fixtures: the script imported from a temp copy, local HTTP fakes."""
+import importlib.util
+import shutil
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # Importing the script loads and saves app_config.json next to it: load a copy in a temp dir.
+    d = tmp_path_factory.mktemp("app")
+    shutil.copy(ROOT / "assshit.py", d / "assshit.py")
+    spec = importlib.util.spec_from_file_location("assshit_under_test", d / "assshit.py")
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = mod
+    spec.loader.exec_module(mod)
+    yield mod
+    sys.modules.pop(spec.name, None)
+
+
+@pytest.fixture
+def serve():
+    """serve(handler_class) -> base URL of a threaded http.server, shut down after the test."""
+    servers = []
+
+    def _serve(handler):
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_address[1]}"
+
+    yield _serve
+    for srv in servers:
+        srv.shutdown()
@@ -0,0 +1,79 @@
+"""Telegram handlers driven with fake updates (no network, no Chrome)."""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+class FakeCallback:
+    def __init__(self, uid, data):
+        self.from_user = SimpleNamespace(id=uid)
+        self.data = data
+        self.answers, self.edits = [], []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edits.append(text)
+
+
+def test_timepad_ok_schedules_start(app, monkeypatch, tmp_path):
+    sent = []
+    monkeypatch.setattr(app, "ALLOWED_USERS", set())
+    monkeypatch.setattr(app, "tg_send_text", lambda text, chat_ids=None: sent.append(text))
+    monkeypatch.setattr(app.scheduler, "path", str(tmp_path / "schedule.json"))
+    monkeypatch.setattr(app, "CURRENT_SNAPSHOT", app.Intervals(60, 15, 120, 30, 60, 15, 60))
+    when = datetime.now() + timedelta(hours=2)
+    cq = FakeCallback(7, "tp:ok")
+    update = SimpleNamespace(callback_query=cq, effective_user=cq.from_user, message=None,
+                             effective_message=None)
+    app.timepad_sessions[7] = {"buf": when.strftime("%H%M"), "chat_id": 1, "msg_id": 1}
+
+    async def tap():
+        await app.handle_timepad(update, None)
+        await asyncio.gather(*app._cmd_tasks)
+
+    try:
+        asyncio.run(tap())
+        jobs = app.scheduler.jobs()
+        assert [j.target for j in jobs] == [when.replace(second=0, microsecond=0)]
+        assert cq.answers == ["Планирую…"] and cq.edits[0].startswith("✅ Запланировано")
+        assert sent and 7 not in app.timepad_sessions
+    finally:
+        app.scheduler.cancel()
+
+
+class FakeMessage:
+    def __init__(self, text, reply_delay=0.0):
+        self.text = text
+        self.reply_delay = reply_delay
+        self.replies = []
+
+    async def reply_text(self, text, reply_markup=None):
+        await asyncio.sleep(self.reply_delay)
+        self.replies.append(text)
+
+
+def _button(uid, text, reply_delay=0.0):
+    msg = FakeMessage(text, reply_delay)
+    return SimpleNamespace(message=msg, effective_message=msg, callback_query=None,
+                           effective_user=SimpleNamespace(id=uid))
+
+
+def test_buttons_queue_commands_in_arrival_order(app, monkeypatch):
+    ran = []
+    monkeypatch.setattr(app, "ALLOWED_USERS", set())
+    monkeypatch.setattr(app, "CURRENT_SNAPSHOT", app.Intervals(60, 15, 120, 30, 60, 15, 60))
+    monkeypatch.setattr(app, "_test_start", lambda snap: ran.append("test") or True)
+    monkeypatch.setattr(app, "_stop_agent", lambda name: ran.append("stop"))
+    # Test's acknowledgement is slow, Stop's is instant: Stop must still run second
+    test, stop = _button(1, "Test", reply_delay=0.2), _button(1, "🛑 Stop")
+
+    async def tap():
+        await asyncio.gather(app.handle_buttons(test, None), app.handle_buttons(stop, None))
+        await asyncio.gather(*app._cmd_tasks)
+
+    asyncio.run(tap())
+    assert ran == ["test", "stop"]
+    assert test.message.replies == ["Стартую сейчас…"]
+    assert stop.message.replies[0] == "🛑 Останавливаю…"
@@ -0,0 +1,97 @@
+"""TgDispatcher against a stdlib http.server fake of the Bot API."""
+import json
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pytest
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    """POST /bot/<method>; replies from script[chat_id] (a list of (status, retry_after)) first, then ok."""
+    script: dict = {}
+    calls: list = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        fields = {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+        chat = int(fields.get("chat_id", 0))
+        self.calls.append((time.monotonic(), self.path.rsplit("/", 1)[1], chat, fields.get("text")))
+        steps = self.script.get(chat)
+        if steps:
+            status, retry_after = steps.pop(0)
+            body = {"ok": False, "error_code": status, "description": "scripted"}
+            if retry_after:
+                body["parameters"] = {"retry_after": retry_after}
+        else:
+            status, body = 200, {"ok": True, "result": {"message_id": len(self.calls)}}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def bot_api(app, monkeypatch, serve):
+    pytest.importorskip("requests")
+    FakeBotApi.script, FakeBotApi.calls = {}, []
+    monkeypatch.setattr(app, "TG_BACKOFF_BASE", 0.1)
+    monkeypatch.setattr(app, "TG_PER_CHAT_INTERVAL", 0.0)
+    return serve(FakeBotApi) + "/bot"
+
+
+@pytest.fixture
+def dispatcher(app, bot_api, tmp_path):
+    d = app.TgDispatcher(api_base=bot_api, journal_path=str(tmp_path / "outbox.jsonl"),
+                         dead_letter_path=str(tmp_path / "dead.jsonl"))
+    yield d
+    d.stop(0.5)
+
+
+def test_429_waits_retry_after(app, dispatcher):
+    FakeBotApi.script = {1: [(429, 1)]}
+    dispatcher.submit(app.OutMsg("sendMessage", [1], text="hi"))
+    assert dispatcher.wait_idle(5)
+    (t0, _, _, _), (t1, _, _, _) = FakeBotApi.calls
+    assert t1 - t0 >= 0.95
+    assert dispatcher.sent == 1
+
+
+def test_5xx_backs_off_then_journals(app, dispatcher, monkeypatch):
+    monkeypatch.setattr(app, "TG_MAX_ATTEMPTS", 3)
+    FakeBotApi.script = {2: [(502, 0)] * 5}
+    dispatcher.submit(app.OutMsg("sendMessage", [2], text="down"))
+    assert dispatcher.wait_idle(5)
+    times = [c[0] for c in FakeBotApi.calls]
+    assert len(times) == 3
+    assert times[2] - times[1] > times[1] - times[0] >= 0.09   # 0.1 s, then 0.2 s
+    lines = Path(dispatcher.journal_path).read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["attempts"] for line in lines] == [3]
+
+
+def test_400_is_dropped_not_retried(app, dispatcher):
+    FakeBotApi.script = {3: [(400, 0)]}
+    dispatcher.submit(app.OutMsg("sendMessage", [3], text="bad"))
+    assert dispatcher.wait_idle(5)
+    assert len(FakeBotApi.calls) == 1 and dispatcher.dropped == 1
+
+
+def test_journal_replayed_on_start(app, dispatcher):
+    fresh = app.OutMsg("sendMessage", [4], text="later", attempts=2)
+    stale = app.OutMsg("sendMessage", [4], text="stale", created=time.time() - app.TG_JOURNAL_MAX_AGE - 1)
+    Path(dispatcher.journal_path).write_text(
+        "".join(json.dumps(m.to_json()) + "\n" for m in (fresh, stale)), encoding="utf-8")
+    dispatcher.start()
+    deadline = time.monotonic() + 5
+    while not FakeBotApi.calls and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert dispatcher.wait_idle(5)
+    assert [c[3] for c in FakeBotApi.calls] == ["later"]
+    assert not Path(dispatcher.journal_path).exists()
+    assert json.loads(Path(dispatcher.dead_letter_path).read_text(encoding="utf-8"))["text"] == "stale"
@@ -0,0 +1,63 @@
+"""PresenceApi against a stdlib http.server fake of the Genesys REST API."""
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+
+class FakeGenesys(BaseHTTPRequestHandler):
+    token = "T" * 32
+    presence = None
+    echo = True      # PATCH answers with the new presence; False = empty body, GET must confirm
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.headers.get("Authorization") != f"Bearer {self.token}":
+            return self._send(401, {})
+        if self.path.startswith("/api/v2/users/me"):
+            return self._send(200, {"id": "u1"})
+        if self.path.startswith("/api/v2/presencedefinitions"):
+            return self._send(200, {"entities": [
+                {"id": "av", "systemPresence": "Available", "primary": True},
+                {"id": "brk2", "systemPresence": "Break"},
+                {"id": "brk", "systemPresence": "Break", "primary": True},
+            ]})
+        if self.path == "/api/v2/users/u1/presences/PURECLOUD":
+            return self._send(200, {"presenceDefinition": {"id": FakeGenesys.presence}})
+        self._send(404, {})
+
+    def do_PATCH(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        FakeGenesys.presence = body["presenceDefinition"]["id"]
+        self._send(200, body if self.echo else {})
+
+
+@pytest.fixture
+def genesys(app, monkeypatch, serve):
+    pytest.importorskip("requests")
+    FakeGenesys.presence, FakeGenesys.echo = None, True
+    monkeypatch.setattr(app.CONFIG, "genesys_api_base", serve(FakeGenesys))
+    return app.PresenceApi(app.genesys_api_base(), lambda: ["x" * 32, FakeGenesys.token])
+
+
+def test_presence_api_sets_primary_definition(app, genesys):
+    genesys.set_status(app.Status.BREAK)
+    assert FakeGenesys.presence == "brk"
+
+
+def test_presence_api_confirms_with_get(app, genesys, monkeypatch):
+    FakeGenesys.echo = False
+    genesys.set_status(app.Status.AVAILABLE)
+    monkeypatch.setattr(FakeGenesys, "do_PATCH", lambda self: self._send(200, {}))   # PATCH ignored
+    with pytest.raises(app.PresenceApiError):
+        genesys.set_status(app.Status.BREAK)
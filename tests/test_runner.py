@@ -0,0 +1,181 @@
+"""StatusBot runner pieces that need no browser."""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+def test_status_confirmed_only_by_its_own_label(app, monkeypatch):
+    monkeypatch.setitem(app.CONFIG.status_labels, "Break", ["Break", "Перерыв"])
+    assert app.label_matches("Перерыв", app.Status.BREAK)
+    assert app.label_matches("On Break", app.Status.BREAK)
+    assert not app.label_matches("Busy", app.Status.BREAK)
+    assert not app.label_matches(None, app.Status.BREAK)
+
+
+def test_wait_until_raises_on_stop(app):
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    t = time.monotonic()
+    with pytest.raises(app.RunStopped):
+        app.wait_until(lambda: False, 30.0, poll=5.0, stop=stop)
+    assert time.monotonic() - t < 2.0
+
+
+def test_presence_reports_last_status_when_runner_busy(app, monkeypatch):
+    def busy():
+        raise app.FutureTimeout()
+    ctrl = SimpleNamespace(driver=object(), current_status=app.Status.BREAK, read_presence=busy)
+    orch = app.Orchestrator()
+    monkeypatch.setattr(orch, "get", lambda name: object())
+    monkeypatch.setattr(orch, "controller", lambda name: ctrl)
+    monkeypatch.setattr(orch, "is_running", lambda name: True)
+    text = orch.presence("x")
+    assert "busy" in text and "Break" in text
+
+
+class FakeDriver:
+    window_handles = ["w"]
+    switch_to = SimpleNamespace(default_content=lambda: None)
+
+    def execute_script(self, *args):
+        return "complete"
+
+
+def test_warm_driver_not_shared_with_a_live_previous_runner(app, monkeypatch):
+    monkeypatch.setattr(app, "DRIVER_HANDOFF_TIMEOUT", 0.3)
+    mgr = app.DriverManager("profile")
+    busy = threading.Event()
+    runner = threading.Thread(target=busy.wait, daemon=True)
+    runner.start()
+    old, new = SimpleNamespace(_runner=runner), SimpleNamespace(_runner=None)
+    driver, _ = mgr.acquire(old, FakeDriver)
+    try:
+        with pytest.raises(RuntimeError):
+            mgr.acquire(new, FakeDriver)
+        monkeypatch.setattr(app, "DRIVER_HANDOFF_TIMEOUT", 5.0)
+        threading.Timer(0.1, mgr.release, args=(old,)).start()
+        assert mgr.acquire(new, FakeDriver) == (driver, False)
+        assert mgr.owner is new
+    finally:
+        busy.set()
+
+
+IV = dict(first_break_after=60, first_break_duration=15, lunch_after=120, lunch_duration=30,
+          second_break_after=60, second_break_duration=15, close_after=600, start_on_shift=0)
+
+
+@pytest.fixture
+def bot(app, monkeypatch):
+    """StatusBot with the browser side stubbed out; .said collects messages, .saved checkpoints."""
+    b = app.StatusBot(app.Intervals(**IV), name="t")
+    b.said, b.saved, b.clicks = [], [], []
+    monkeypatch.setattr(b, "_open_session", lambda: None)
+    monkeypatch.setattr(b, "_say", b.said.append)
+    monkeypatch.setattr(b, "_notify", lambda event, text, caption, settle=0.0: b.said.append((event, text)))
+    monkeypatch.setattr(b, "_select_status", lambda status, stabilize_checks=None: b.clicks.append(status) or True)
+    monkeypatch.setattr(app, "save_checkpoint", lambda name, cp: b.saved.append(cp))
+    return b
+
+
+def _started_ago(bot, seconds, next_step):
+    bot.t0 = (time.monotonic() - seconds, time.time() - seconds)
+    bot._next_step = next_step
+
+
+def test_unconfirmed_status_is_reported_and_not_checkpointed(app, bot, monkeypatch):
+    monkeypatch.setattr(bot, "_select_status", lambda status, stabilize_checks=None: False)
+    _started_ago(bot, 61, 1)   # first break (t0 + 60 s) is due
+    assert bot._run_once() is False
+    assert bot._next_step == 1 and bot.saved == []
+    assert ("error", "Error: status Break not confirmed") in bot.said
+    assert not any("Status set to" in str(m) for m in bot.said)
+
+
+def test_unconfirmed_force_is_reported_as_failure(app, bot, monkeypatch):
+    monkeypatch.setattr(bot, "_select_status", lambda status, stabilize_checks=None: False)
+    bot.driver = object()
+    bot.force_status(app.Status.MEAL)
+    assert bot.said == [("error", "Force failed: status Meal not confirmed")]
+
+
+class SlowObserverDriver(FakeDriver):
+    """execute_async_script blocks for the requested slice and never sees the label change."""
+    def __init__(self):
+        self.slices = []
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_async_script(self, script, expects, since_ms, timeout_ms):
+        self.slices.append(timeout_ms)
+        time.sleep(timeout_ms / 1000.0)
+        return {"ok": False, "label": "Busy"}
+
+
+def test_stop_interrupts_observer_confirmation(app, bot, monkeypatch):
+    monkeypatch.setitem(app.CONFIG.waits, "status_confirm_timeout", 30.0)
+    bot.driver = driver = SlowObserverDriver()
+    threading.Timer(0.3, bot.request_stop).start()
+    t = time.monotonic()
+    with pytest.raises(app.RunStopped):
+        bot._wait_status_applied(app.Status.BREAK, "Available", app.now_ms(), armed_ms=app.now_ms())
+    assert time.monotonic() - t < 1.0
+    assert max(driver.slices) <= app.PRESENCE_WAIT_SLICE * 1000
+
+
+def test_sleep_to_reanchors_after_suspend(app, bot):
+    # monotonic clock stood still for 100 s while the wall clock went on: the step is due now
+    now_m, now_w = time.monotonic(), time.time()
+    steps = [app.Step("status", app.Status.BREAK, now_m + 99, now_w - 1),
+             app.Step("ready", app.Status.AVAILABLE, now_m + 199, now_w + 99)]
+    bot.t0 = (now_m - 1, now_w - 101)
+    assert bot._sleep_to(steps[0], steps) is True
+    assert steps[0].at_mono <= time.monotonic() and abs(steps[1].at_mono - (now_m + 99)) < 0.5
+    assert abs(bot.t0[0] - (now_m - 101)) < 0.5
+
+
+def test_sleep_to_ignores_clock_set_back(app, bot):
+    now_m, now_w = time.monotonic(), time.time()
+    steps = [app.Step("status", app.Status.BREAK, now_m + 0.05, now_w + 3600)]
+    bot.t0 = (now_m, now_w)
+    assert bot._sleep_to(steps[0], steps) is False
+    assert steps[0].at_mono == now_m + 0.05
+
+
+def test_resume_replays_only_the_latest_missed_change(app, bot):
+    # down since before the first break: Break, Ready and Meal are all due, only Meal is clicked
+    bot.restore({"t0_ts": time.time() - 200, "next_step": 1, "status": "Available",
+                 "intervals": app.intervals_to_dict(bot.intervals)})
+    timeline = app.compile_timeline(bot.intervals, *bot.t0)
+    assert bot._catch_up(timeline) == {1, 2}
+    assert timeline[3].status is app.Status.MEAL
+
+
+def test_resume_after_shift_end_clicks_last_change_and_finishes(app, bot):
+    bot.restore({"t0_ts": time.time() - IV["close_after"] - 1, "next_step": 1, "status": "Available"})
+    assert bot._run_once() is True
+    assert bot.clicks == [app.Status.AVAILABLE]
+    assert bot.said[-1] == "Shift is over."
+
+
+def test_expired_checkpoint_is_dropped(app, monkeypatch):
+    dropped, started = [], []
+    cp = {"t0": "x", "t0_ts": time.time() - 10 * 3600, "next_step": 2, "status": "Break",
+          "intervals": app.intervals_to_dict(app.Intervals(**IV))}
+    monkeypatch.setattr(app, "load_checkpoints", lambda: {"a": cp})
+    monkeypatch.setattr(app, "save_checkpoint", lambda name, value: dropped.append((name, value)))
+    monkeypatch.setattr(app.orchestrator, "get", lambda name: object())
+    monkeypatch.setattr(app.orchestrator, "start", lambda *a, **kw: started.append(a) or True)
+    assert app.resume_saved_runs() == []
+    assert dropped == [("a", None)] and started == []
+
+
+def test_checkpoint_cleared_when_retries_run_out(app, bot, monkeypatch):
+    monkeypatch.setattr(app, "RESTART_MAX_TRIES", 1)
+    monkeypatch.setattr(app, "RESTART_BACKOFF", 0)
+    monkeypatch.setattr(bot, "_run_once", lambda: False)
+    bot.run()
+    assert bot.saved == [None]
+    assert any(str(m).startswith("Giving up") for m in bot.said)
@@ -0,0 +1,91 @@
+"""Heap scheduler: weekly re-arming, missed-start grace, schedule.json, reschedule."""
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def sched(app, monkeypatch, tmp_path):
+    started, notes = [], []
+    monkeypatch.setattr(app.orchestrator, "start",
+                        lambda agent, intervals=None, start_at=None: started.append((agent, start_at)) or True)
+    monkeypatch.setattr(app.orchestrator, "reschedule", lambda agent, target, intervals=None: False)
+    monkeypatch.setattr(app, "tg_send_text", lambda text, chat_ids=None: notes.append(text))
+    monkeypatch.setattr(app.CONFIG, "weekly_schedule", [])
+    s = app.Scheduler(str(tmp_path / "schedule.json"))
+    s.started, s.notes = started, notes
+    yield s
+    s.cancel()
+    s._drop(lambda j: True)
+
+
+def _iv(app):
+    return app.Intervals(60, 15, 120, 30, 60, 15, 600)
+
+
+def test_next_weekly_is_strictly_after(app):
+    mon_9 = datetime(2026, 10, 12, 9, 0)   # a Monday
+    assert app._next_weekly(0, 9, 0, mon_9) == mon_9 + timedelta(days=7)
+    assert app._next_weekly(2, 17, 30, mon_9) == datetime(2026, 10, 14, 17, 30)
+
+
+def test_weekly_job_fires_and_rearms_for_next_week(app, sched):
+    target = datetime.now().replace(microsecond=0) - timedelta(seconds=1)
+    sched._add(dict(target=target, agent="a", weekly=(target.weekday(), target.hour, target.minute)))
+    deadline = time.monotonic() + 5
+    while not sched.started and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sched.started == [("a", target)]
+    [job] = sched.jobs()
+    assert job.weekly and job.target == target.replace(second=0) + timedelta(days=7)
+
+
+def test_missed_start_past_grace_is_skipped(app, sched):
+    late = app.Job(1, datetime.now() - timedelta(seconds=app.SCHED_MISSED_GRACE_SEC + 60), agent="a")
+    sched._fire(late)
+    assert sched.started == [] and len(sched.notes) == 1
+    on_time = app.Job(2, datetime.now() - timedelta(seconds=5), agent="a")
+    sched._fire(on_time)
+    assert sched.started == [("a", on_time.target)]
+
+
+def test_schedule_json_round_trip(app, sched):
+    when = (datetime.now() + timedelta(hours=3)).replace(second=0, microsecond=0)
+    sched.schedule_start(when, _iv(app), lead=30, agent="a")
+    [saved] = json.loads(open(sched.path, encoding="utf-8").read())
+    assert saved["agent"] == "a" and saved["lead"] == 30
+
+    again = app.Scheduler(sched.path)
+    try:
+        assert again.load() == 1
+        [job] = again.jobs()
+        assert (job.target, job.agent, job.lead, job.intervals) == (when, "a", 30.0, _iv(app))
+    finally:
+        again._drop(lambda j: True)
+
+
+def test_load_skips_starts_missed_while_down(app, sched):
+    old = datetime.now() - timedelta(seconds=app.SCHED_MISSED_GRACE_SEC + 60)
+    with open(sched.path, "w", encoding="utf-8") as f:
+        json.dump([{"target": old.isoformat(), "agent": "a", "lead": 0, "intervals": None}], f)
+    assert sched.load() == 0 and sched.jobs() == []
+
+
+def test_start_replaces_the_agents_previous_one_shot(app, sched):
+    sched.schedule_start(datetime.now() + timedelta(hours=2), None, lead=0, agent="a")
+    sched.schedule_start(datetime.now() + timedelta(hours=2), None, lead=0, agent="b")
+    when = (datetime.now() + timedelta(hours=4)).replace(second=0, microsecond=0)
+    sched.schedule_start(when, None, lead=0, agent="a")
+    assert sorted((j.agent, j.target == when) for j in sched.jobs()) == [("a", True), ("b", False)]
+
+
+def test_prelaunched_run_is_moved_not_duplicated(app, sched, monkeypatch):
+    moved = []
+    monkeypatch.setattr(app.orchestrator, "reschedule",
+                        lambda agent, target, intervals=None: moved.append((agent, target)) or True)
+    when = (datetime.now() + timedelta(hours=1)).replace(second=0, microsecond=0)
+    sched.schedule_start(when, _iv(app), agent="a")
+    assert moved == [("a", when)] and sched.jobs() == []
+    assert json.loads(open(sched.path, encoding="utf-8").read()) == []
@@ -0,0 +1,24 @@
+"""compile_timeline: absolute deadlines from intervals and custom segments."""
+
+
+def _plan(steps, t0):
+    return [(s.kind, s.status.value if s.status else None, s.at_ts - t0) for s in steps]
+
+
+def test_segments_replace_the_default_shape(app):
+    B, M = app.Status.BREAK, app.Status.MEAL
+    iv = app.Intervals(1, 1, 1, 1, 1, 1, close_after=100, start_on_shift=30,
+                       segments=(app.Segment(B, 100, 10), app.Segment(M, 50)))
+    steps = app.compile_timeline(iv, 5000.0, 1000.0)
+    # a segment with no duration stays in its status; the end waits for the last transition
+    assert _plan(steps, 1000.0) == [("shift_start", "Available", 30), ("status", "Break", 130),
+                                    ("ready", "Available", 140), ("status", "Meal", 190), ("end", None, 190)]
+    assert [s.at_mono - 5000.0 for s in steps] == [s.at_ts - 1000.0 for s in steps]
+
+
+def test_default_shape_ends_at_close_after(app):
+    iv = app.Intervals(60, 15, 120, 30, 60, 15, close_after=3600, start_on_shift=0)
+    plan = _plan(app.compile_timeline(iv, 0.0, 0.0), 0.0)
+    assert plan == [("shift_start", "Available", 0), ("status", "Break", 60), ("ready", "Available", 75),
+                    ("status", "Meal", 195), ("ready", "Available", 225), ("status", "Break", 285),
+                    ("ready", "Available", 300), ("end", None, 3600)]
@@ -0,0 +1,56 @@
+"""Webhook listener: path, secret and size checks, valid updates reach the bot's queue."""
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+
+@pytest.fixture
+def webhook(app, serve):
+    # the listener hands updates to the bot loop's update_queue, as Application does with polling
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    tg_app = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    url = serve(app._webhook_handler(tg_app, loop, "/tg", "s3cret"))
+    yield SimpleNamespace(url=url, app=tg_app, loop=loop)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def _post(url, body=b"{}", secret="s3cret", length=None):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+    if length is not None:
+        headers["Content-Length"] = str(length)   # the listener must refuse before reading the body
+    req = Request(url, data=body, method="POST", headers=headers)
+    try:
+        with urlopen(req, timeout=5) as r:
+            return r.status
+    except HTTPError as e:
+        return e.code
+
+
+def test_webhook_rejects_wrong_path_secret_and_size(app, webhook):
+    assert _post(webhook.url + "/other") == 404
+    assert _post(webhook.url + "/tg", secret="nope") == 403
+    assert _post(webhook.url + "/tg", length=app.WEBHOOK_MAX_BODY + 1) == 413
+    assert webhook.app.update_queue.empty()
+
+
+def test_webhook_queues_valid_update(app, webhook):
+    pytest.importorskip("telegram")
+    body = {"update_id": 42, "message": {"message_id": 1, "date": int(time.time()), "text": "Check status",
+                                         "chat": {"id": 5, "type": "private"},
+                                         "from": {"id": 5, "is_bot": False, "first_name": "A"}}}
+    assert _post(webhook.url + "/tg", body=json.dumps(body).encode()) == 200
+    got = asyncio.run_coroutine_threadsafe(
+        asyncio.wait_for(webhook.app.update_queue.get(), 5), webhook.loop).result(6)
+    assert got.update_id == 42 and got.message.text == "Check status"
+
+
+def test_webhook_misconfigured_falls_back(app, monkeypatch):
+    monkeypatch.setattr(app.CONFIG, "tg_webhook", {**app.CONFIG.tg_webhook, "url": "", "secret": ""})
+    assert app._run_webhook(None, None) is False